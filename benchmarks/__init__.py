@@ -0,0 +1 @@
+"""Benchmarks for the dashboard's request paths against local fake upstream services."""
@@ -0,0 +1,104 @@
+"""Runs the benchmark suite and writes its results as JSON.
+
+Usage (from the root directory):
+
+    poetry run python -m benchmarks --output results.json
+
+The benchmarks run against local fake Galaxy and Prometheus servers with a temporary database and cache, so they don't
+need a .env file or access to any real services. Run with --help to see the available options.
+"""
+
+import json
+import os
+import sys
+from argparse import ArgumentParser, Namespace
+from asyncio import new_event_loop
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List
+
+from .environment import configure_environment, get_commit
+from .fakes import FakeGalaxy, FakePrometheus
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(prog="python -m benchmarks", description="Benchmarks the dashboard against fake services.")
+    parser.add_argument("--output", default="-", help="File to write the JSON results to. Defaults to stdout.")
+    parser.add_argument("--iterations", type=int, default=10, help="Number of measured runs of each benchmark.")
+    parser.add_argument("--only", action="append", default=[], help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--galaxy-latency", type=float, default=0.005, help="Seconds each Galaxy API request takes.")
+    parser.add_argument("--probe-latency", type=float, default=0.02, help="Seconds each interactive tool takes.")
+    parser.add_argument("--prometheus-latency", type=float, default=0.005, help="Seconds each Prometheus call takes.")
+    parser.add_argument("--job-counts", type=_parse_counts, default=[1, 10, 100], help="Running jobs to monitor.")
+    parser.add_argument("--file-counts", type=_parse_counts, default=[1, 10], help="File inputs to launch jobs with.")
+    parser.add_argument("--tool-count", type=int, default=100, help="Number of tools that Galaxy lists.")
+    parser.add_argument("--alert-count", type=int, default=500, help="Number of alerts that Prometheus returns.")
+    parser.add_argument("--target-count", type=int, default=500, help="Number of targets that Prometheus returns.")
+
+    return parser.parse_args()
+
+
+def _parse_counts(value: str) -> List[int]:
+    return [int(count) for count in value.split(",")]
+
+
+def print_summary(results: List[Dict[str, Any]]) -> None:
+    print(f"{'benchmark':<60} {'median':>10} {'p95':>10} {'max':>10}", file=sys.stderr)
+    for result in results:
+        params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(
+            f"{result['name'] + ' (' + params + ')':<60} "
+            f"{result['median'] * 1000:>8.2f}ms {result['p95'] * 1000:>8.2f}ms {result['max'] * 1000:>8.2f}ms",
+            file=sys.stderr,
+        )
+
+
+def main() -> None:
+    args = parse_args()
+
+    galaxy = FakeGalaxy(args.galaxy_latency, args.probe_latency, args.tool_count)
+    galaxy.start()
+    prometheus = FakePrometheus(args.prometheus_latency, args.alert_count, args.target_count)
+    prometheus.start()
+    loop = new_event_loop()
+    try:
+        with TemporaryDirectory() as directory:
+            configure_environment(directory, galaxy.url, prometheus.url)
+            # Benchmarks measure each scan rather than sharing scans between calls.
+            os.environ["GALAXY_MONITOR_COALESCE_WINDOW"] = "0"
+
+            import django
+            from django.core.management import call_command
+
+            django.setup()
+            call_command("migrate", verbosity=0)
+
+            # The suite imports the dashboard, which requires Django to be set up.
+            from .suite import Suite
+
+            options = {**vars(args), "directory": directory}
+            results = Suite(loop, galaxy, options).run()
+    finally:
+        loop.close()
+        galaxy.stop()
+        prometheus.stop()
+
+    report = {
+        **get_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    print_summary(results)
+
+
+if __name__ == "__main__":
+    main()
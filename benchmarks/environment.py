@@ -0,0 +1,47 @@
+"""Configures the dashboard to run against the fake services."""
+
+import os
+import subprocess
+from typing import Any, Dict
+
+from cryptography.fernet import Fernet
+
+from .fakes import HISTORY_NAME
+
+
+def configure_environment(directory: str, galaxy_url: str, prometheus_url: str) -> None:
+    # Results shouldn't depend on the local .env file, so every setting that affects them is set here.
+    os.environ.update(
+        {
+            "DJANGO_SETTINGS_MODULE": "src.launcher_app.settings",
+            "DEBUG": "false",
+            "SECRET_KEY": "benchmark-secret-key",
+            "REFRESH_TOKEN_KEY": Fernet.generate_key().decode(),
+            "BASE_URL": "http://localhost:8080",
+            "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'db.sqlite3')}",
+            "CACHE_BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "CACHE_LOCATION": os.path.join(directory, "cache"),
+            "GALAXY_URL": galaxy_url,
+            "GALAXY_API_KEY_ENDPOINT": "/api/authenticate/baseauth",
+            "GALAXY_HISTORY_NAME": HISTORY_NAME,
+            "TOOL_PREFIX": "nova",
+            "ALERTS_FORMAT": "prometheus",
+            "ALERTS_ENVIRONMENTS": '["prod", "test"]',
+            "ALERTS_URL": f"{prometheus_url}/api/v1/alerts",
+            "TARGETS_URL": f"{prometheus_url}/api/v1/targets",
+        }
+    )
+    for provider in ["UCAMS", "XCAMS"]:
+        for setting in ["AUTH_URL", "TOKEN_URL", "CLIENT_ID", "CLIENT_SECRET", "REDIRECT_PATH", "SCOPES"]:
+            os.environ[f"{provider}_{setting}"] = provider.lower()
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+
+def get_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True).stdout
+        status = subprocess.run(["git", "status", "--porcelain"], capture_output=True, check=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+    return {"commit": commit.strip(), "dirty": bool(status.strip())}
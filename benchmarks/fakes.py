@@ -0,0 +1,241 @@
+"""Local stand-ins for the Galaxy and Prometheus APIs used by the dashboard.
+
+Each fake runs an HTTP server on a random local port in a background thread. Every response is delayed by a
+configurable latency to simulate the round trip to the real service.
+"""
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock, Thread
+from time import sleep
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+HISTORY_NAME = "launcher_history"
+HISTORY_ID = "history_main"
+DATAFILE_TOOLS_HISTORY_ID = "history_datafile_tools"
+DATA_HISTORY_ID = "history_data"
+
+
+class FakeServer:
+    """Serves a fake API from a background thread."""
+
+    def __init__(self, latency: float):
+        """Init."""
+        self.latency = latency
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keeps connections alive between requests, like the real services. Without disabling Nagle's algorithm,
+            # every response would be delayed until the client acknowledges its headers.
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:  # noqa: N802
+                fake.handle(self, "GET")
+
+            def do_HEAD(self) -> None:  # noqa: N802
+                fake.handle(self, "HEAD")
+
+            def do_POST(self) -> None:  # noqa: N802
+                fake.handle(self, "POST")
+
+            def do_PUT(self) -> None:  # noqa: N802
+                fake.handle(self, "PUT")
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # The dashboard opens many connections at once when it probes jobs concurrently.
+            request_queue_size = 1024
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        length = int(handler.headers.get("Content-Length", 0))
+        body = handler.rfile.read(length) if length else b""
+
+        latency, status, content_type, content = self.respond(method, url.path, query, body)
+        sleep(latency)
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        if method != "HEAD":
+            handler.wfile.write(content)
+
+    def respond(
+        self, method: str, path: str, query: Dict[str, List[str]], body: bytes
+    ) -> Tuple[float, int, str, bytes]:
+        raise NotImplementedError
+
+    def json(self, data: Any, status: int = 200, latency: Optional[float] = None) -> Tuple[float, int, str, bytes]:
+        return self.latency if latency is None else latency, status, "application/json", json.dumps(data).encode()
+
+
+class FakeGalaxy(FakeServer):
+    """Fake Galaxy API.
+
+    Reports running_jobs running interactive tools in the dashboard's history. Each tool is reachable at its own URL,
+    which responds after probe_latency seconds. Jobs that the dashboard submits finish immediately.
+    """
+
+    def __init__(self, latency: float, probe_latency: float, tool_count: int):
+        """Init."""
+        super().__init__(latency)
+        self.probe_latency = probe_latency
+        self.tool_count = tool_count
+        self.running_jobs = 0
+        self.submitted_jobs = count()
+        self.request_counts: Dict[str, int] = {}
+        self.request_counts_lock = Lock()
+
+    def respond(
+        self, method: str, path: str, query: Dict[str, List[str]], body: bytes
+    ) -> Tuple[float, int, str, bytes]:
+        route = self._get_route(method, path)
+        with self.request_counts_lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+        match route:
+            case "HEAD /":
+                return self.json({})
+            case "GET /api/version":
+                return self.json({"version_major": "24.1", "version_minor": "0"})
+            case "GET /api/histories":
+                return self.json(
+                    [
+                        {"id": HISTORY_ID, "name": HISTORY_NAME},
+                        {"id": DATAFILE_TOOLS_HISTORY_ID, "name": f"{HISTORY_NAME}_datafile_tools"},
+                        {"id": DATA_HISTORY_ID, "name": f"{HISTORY_NAME}_data"},
+                    ]
+                )
+            case "GET /api/tools":
+                return self.json(self._get_tools())
+            case "POST /api/tools":
+                job_id = f"submitted_{next(self.submitted_jobs)}"
+                return self.json(
+                    {
+                        "jobs": [{"id": job_id}],
+                        "outputs": [
+                            {"name": "output", "output_name": "output", "id": f"dataset_{job_id}", "file_ext": "nxs"}
+                        ],
+                        "output_collections": [],
+                    }
+                )
+            case "GET /api/jobs":
+                return self.json(self._get_jobs(query))
+            case "GET /api/jobs/{id}":
+                job_id = path.split("/")[3]
+                return self.json({"id": job_id, "state": "ok", "params": {}, "tool_id": "fake"})
+            case "GET /api/entry_points":
+                job_id = query.get("job_id", [""])[0]
+                return self.json([{"job_id": job_id, "target": f"/interactivetool/ep/{job_id}/"}])
+            case "GET /api/datasets/{id}":
+                dataset_id = path.split("/")[3]
+                return self.json({"id": dataset_id, "state": "ok", "deleted": False, "purged": False})
+            case "GET /interactivetool":
+                return self.probe_latency, 200, "text/html", b"<html><body>Interactive tool</body></html>"
+            case _:
+                return self.json({"err_msg": f"Unknown route {method} {path}"}, status=404)
+
+    def _get_route(self, method: str, path: str) -> str:
+        parts = path.rstrip("/").split("/")
+        if path.startswith("/interactivetool/"):
+            return f"{method} /interactivetool"
+        if len(parts) == 4 and parts[2] in ["jobs", "datasets"]:
+            return f"{method} /api/{parts[2]}/{{id}}"
+
+        return f"{method} {path.rstrip('/') or '/'}"
+
+    def _get_jobs(self, query: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        states = query.get("state", [])
+        if query.get("history_id", [""])[0] != HISTORY_ID or "running" not in states:
+            return []
+
+        return [
+            {"id": f"job_{index}", "tool_id": f"nova_tool_{index}", "state": "running", "history_id": HISTORY_ID}
+            for index in range(self.running_jobs)
+        ]
+
+    def _get_tools(self) -> List[Dict[str, Any]]:
+        categories = []
+        for category in range(max(self.tool_count // 10, 1)):
+            elems = [
+                {
+                    "id": f"nova_tool_{category}_{index}",
+                    "name": f"Tool {index}",
+                    "version": "1.0.0",
+                    "help": "<p>Visualizes reduced data.</p>\n<p>More details about the tool.</p>" * 5,
+                }
+                for index in range(10)
+            ]
+            categories.append({"id": f"category-{category}-main", "name": f"Category {category}", "elems": elems})
+
+        return categories
+
+
+class FakePrometheus(FakeServer):
+    """Fake Prometheus alerts and targets API."""
+
+    def __init__(self, latency: float, alert_count: int, target_count: int):
+        """Init."""
+        super().__init__(latency)
+        self.alerts = create_alerts(alert_count)
+        self.targets = create_targets(target_count)
+
+    def respond(
+        self, method: str, path: str, query: Dict[str, List[str]], body: bytes
+    ) -> Tuple[float, int, str, bytes]:
+        match path:
+            case "/api/v1/alerts":
+                return self.json(self.alerts)
+            case "/api/v1/targets":
+                return self.json(self.targets)
+            case _:
+                return self.json({"status": "error"}, status=404)
+
+
+def create_alerts(alert_count: int) -> Dict[str, Any]:
+    alerts = [
+        {
+            "annotations": {"description": f"Alert {index} description", "title": f"Alert {index}"},
+            "labels": {
+                "alias": f"service-{index}",
+                "env": ["prod", "test", "other"][index % 3],
+                "nova_group": f"group-{index % 5}",
+                "severity": "warning",
+            },
+        }
+        for index in range(alert_count)
+    ]
+
+    return {"status": "success", "data": {"alerts": alerts}}
+
+
+def create_targets(target_count: int) -> Dict[str, Any]:
+    targets = [
+        {"labels": {"alias": f"service-{index}", "env": ["prod", "test", "other"][index % 3], "nova_group": "group"}}
+        for index in range(target_count)
+    ]
+
+    return {"status": "success", "data": {"activeTargets": targets}}
@@ -0,0 +1,419 @@
+"""Load tests the dashboard API with simulated users and writes the results as JSON.
+
+Usage (from the root directory):
+
+    poetry run pip install gunicorn uvicorn-worker
+    poetry run python -m benchmarks.load --users 10,50,100 --output results.json
+
+The dashboard is served by gunicorn with uvicorn workers, like in the Docker image, against local fake Galaxy and
+Prometheus servers with a temporary database and cache. Each simulated user is a logged in browser session that makes
+the same requests as the Vue client while the dashboard is open:
+
+- on page load, the user, tool list and status target requests
+- every 2 seconds, the job monitor request (with --monitor stream, a job monitor stream is kept open instead)
+- every 5 seconds, the status alerts request
+- every 60 seconds, the notification request, which is answered with 304 while the notification is unchanged
+
+Like the browser's setInterval, polls are sent on schedule even if the previous response hasn't arrived yet, so an
+overloaded server falls further behind instead of slowing its users down. For each number of users, the users open the
+dashboard over --ramp-up seconds and keep it open for --duration seconds. The throughput, latency percentiles and error
+rate of each endpoint are reported. A number of users is sustained if fewer than 1% of requests fail and the 95th
+percentile latency of job monitoring stays below its poll interval.
+
+The load generator, the fake services and the workers share the machine, so results are best compared between runs on
+the same machine. Run with --help to see the available options.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, Namespace
+from asyncio import Task, create_task, gather, run, sleep, wait_for
+from asyncio import TimeoutError as AsyncTimeoutError
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib import import_module
+from importlib.util import find_spec
+from multiprocessing import Event, Process, Queue
+from multiprocessing.synchronize import Event as EventType
+from socket import socket
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import monotonic, perf_counter
+from typing import Any, Coroutine, Dict, Iterator, List, Optional, Set, Tuple
+
+from httpx import AsyncClient, Client, HTTPError, Limits, Response, Timeout
+
+from .environment import configure_environment, get_commit
+from .fakes import FakeGalaxy, FakePrometheus
+
+MONITOR_INTERVAL = 2
+STATUS_INTERVAL = 5
+NOTIFICATION_INTERVAL = 60
+# Number of seconds that a browser waits before reconnecting a closed event stream.
+STREAM_RETRY_INTERVAL = 3
+# Browsers open at most this many connections to the same server.
+BROWSER_CONNECTIONS = 6
+REQUEST_TIMEOUT = 30
+# Share of failed requests above which a number of users isn't sustained.
+MAX_ERROR_RATE = 0.01
+SERVER_START_TIMEOUT = 60
+
+MONITOR_ENDPOINT = "/api/galaxy/monitor/"
+STREAM_ENDPOINT = "/api/galaxy/monitor/stream/"
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(
+        prog="python -m benchmarks.load", description="Load tests the dashboard with simulated users."
+    )
+    parser.add_argument("--output", default="-", help="File to write the JSON results to. Defaults to stdout.")
+    parser.add_argument("--users", type=_parse_counts, default=[10, 50, 100], help="Numbers of users to simulate.")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to simulate each number of users for.")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which the users open the dashboard.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of gunicorn workers.")
+    parser.add_argument("--monitor", choices=["poll", "stream"], default="poll", help="How users monitor their jobs.")
+    parser.add_argument("--jobs", type=int, default=1, help="Running jobs that each user monitors.")
+    parser.add_argument("--database-url", help="Database to use instead of a temporary SQLite database.")
+    parser.add_argument("--galaxy-latency", type=float, default=0.05, help="Seconds each Galaxy API request takes.")
+    parser.add_argument("--probe-latency", type=float, default=0.02, help="Seconds each interactive tool takes.")
+    parser.add_argument("--prometheus-latency", type=float, default=0.05, help="Seconds each Prometheus call takes.")
+    parser.add_argument("--tool-count", type=int, default=100, help="Number of tools that Galaxy lists.")
+    parser.add_argument("--alert-count", type=int, default=50, help="Number of alerts that Prometheus returns.")
+    parser.add_argument("--target-count", type=int, default=50, help="Number of targets that Prometheus returns.")
+
+    return parser.parse_args()
+
+
+def _parse_counts(value: str) -> List[int]:
+    return [int(count) for count in value.split(",")]
+
+
+class Recorder:
+    """Collects the latency and outcome of every request by endpoint."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, latency: float, ok: bool) -> None:
+        self.latencies[endpoint].append(latency)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summarize(self, duration: float) -> Dict[str, Any]:
+        endpoints = {
+            endpoint: summarize(latencies, self.errors[endpoint], duration)
+            for endpoint, latencies in sorted(self.latencies.items())
+        }
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        total = summarize(all_latencies, sum(self.errors.values()), duration)
+
+        return {"endpoints": endpoints, "total": total}
+
+
+def summarize(latencies: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    if not latencies:
+        return {"requests": 0, "errors": 0, "error_rate": 0.0, "throughput": 0.0}
+
+    percentiles = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": errors / len(latencies),
+        "throughput": len(latencies) / duration,
+        "unit": "seconds",
+        "p50": percentiles[49],
+        "p95": percentiles[94],
+        "p99": percentiles[98],
+        "max": max(latencies),
+    }
+
+
+class User:
+    """A logged in user with the dashboard open in their browser."""
+
+    def __init__(self, url: str, host: str, session_cookie: Tuple[str, str], recorder: Recorder, monitor: str):
+        """Init."""
+        self.client = AsyncClient(
+            base_url=url,
+            headers={"Host": host},
+            cookies=dict([session_cookie]),
+            limits=Limits(max_connections=BROWSER_CONNECTIONS),
+            timeout=REQUEST_TIMEOUT,
+        )
+        self.recorder = recorder
+        self.monitor = monitor
+        self.notification_etag = ""
+        self.requests: Set[Task] = set()
+
+    async def run(self, delay: float, end: float) -> None:
+        await sleep(delay)
+
+        # The client fetches the user first, which also sets the CSRF cookie.
+        await self.request("/api/auth/user/", "GET")
+        self.send(self.request("/api/galaxy/tools/", "GET"))
+        self.send(self.request("/api/status/targets/", "GET"))
+
+        polls = [
+            self.poll(self.get_alerts, STATUS_INTERVAL, end),
+            self.poll(self.get_notification, NOTIFICATION_INTERVAL, end),
+        ]
+        if self.monitor == "stream":
+            polls.append(self.stream_jobs(end))
+        else:
+            polls.append(self.poll(self.monitor_jobs, MONITOR_INTERVAL, end))
+        await gather(*polls)
+
+        await gather(*self.requests)
+        await self.client.aclose()
+
+    async def poll(self, request: Any, interval: float, end: float) -> None:
+        next_time = monotonic()
+        while next_time < end:
+            self.send(request())
+            next_time += interval
+            await sleep(max(min(next_time, end) - monotonic(), 0))
+
+    def send(self, request: Coroutine[Any, Any, Any]) -> None:
+        task = create_task(request)
+        self.requests.add(task)
+        task.add_done_callback(self.requests.discard)
+
+    async def request(self, endpoint: str, method: str, **kwargs: Any) -> Optional[Response]:
+        start = perf_counter()
+        try:
+            response = await self.client.request(method, endpoint, **kwargs)
+        except HTTPError:
+            self.recorder.record(endpoint, perf_counter() - start, ok=False)
+            return None
+
+        self.recorder.record(endpoint, perf_counter() - start, ok=response.status_code < 400)
+        return response
+
+    async def get_alerts(self) -> None:
+        await self.request("/api/status/alerts/", "GET")
+
+    async def get_notification(self) -> None:
+        headers = {"If-None-Match": self.notification_etag} if self.notification_etag else {}
+        response = await self.request("/api/notification/", "GET", headers=headers)
+        if response is not None and response.status_code == 200:
+            self.notification_etag = response.headers.get("ETag", "")
+
+    async def monitor_jobs(self) -> None:
+        await self.request(
+            MONITOR_ENDPOINT,
+            "POST",
+            json={"tool_ids": {}},
+            headers={"X-CSRFToken": self.client.cookies.get("csrftoken", "")},
+        )
+
+    async def stream_jobs(self, end: float) -> None:
+        while monotonic() < end:
+            try:
+                await wait_for(self.read_stream(), timeout=end - monotonic())
+            except AsyncTimeoutError:
+                return
+            await sleep(max(min(STREAM_RETRY_INTERVAL, end - monotonic()), 0))
+
+    async def read_stream(self) -> None:
+        # Each connection is recorded with the time until its first event, which is when the user sees their jobs.
+        start = perf_counter()
+        try:
+            async with self.client.stream(
+                "GET",
+                STREAM_ENDPOINT,
+                params={"tool_ids": "{}"},
+                timeout=Timeout(REQUEST_TIMEOUT, read=None),
+            ) as response:
+                if response.status_code >= 400:
+                    self.recorder.record(STREAM_ENDPOINT, perf_counter() - start, ok=False)
+                    return
+
+                recorded = False
+                async for line in response.aiter_lines():
+                    if line.startswith("event: galaxy_error"):
+                        # The client stops monitoring when Galaxy fails, so the stream is reopened.
+                        self.recorder.record(STREAM_ENDPOINT, perf_counter() - start, ok=False)
+                        return
+                    if line.startswith("data:") and not recorded:
+                        self.recorder.record(STREAM_ENDPOINT, perf_counter() - start, ok=True)
+                        recorded = True
+        except HTTPError:
+            self.recorder.record(STREAM_ENDPOINT, perf_counter() - start, ok=False)
+
+
+async def simulate(url: str, host: str, session_cookies: List[Tuple[str, str]], args: Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+    end = monotonic() + args.duration
+    users = [User(url, host, session_cookie, recorder, args.monitor) for session_cookie in session_cookies]
+    await gather(*(user.run(args.ramp_up * index / len(users), end) for index, user in enumerate(users)))
+
+    results = recorder.summarize(args.duration)
+    monitor = results["endpoints"].get(STREAM_ENDPOINT if args.monitor == "stream" else MONITOR_ENDPOINT, {})
+    sustained = results["total"]["error_rate"] < MAX_ERROR_RATE and monitor.get("p95", 0) < MONITOR_INTERVAL
+
+    return {"users": len(users), "sustained": sustained, **results}
+
+
+def serve_fakes(args: Namespace, urls: "Queue[Tuple[str, str]]", stop: EventType) -> None:
+    # The fakes run in their own process, so that they don't compete with the load generator for the GIL.
+    galaxy = FakeGalaxy(args.galaxy_latency, args.probe_latency, args.tool_count)
+    galaxy.running_jobs = args.jobs
+    galaxy.start()
+    prometheus = FakePrometheus(args.prometheus_latency, args.alert_count, args.target_count)
+    prometheus.start()
+
+    urls.put((galaxy.url, prometheus.url))
+    stop.wait()
+
+    galaxy.stop()
+    prometheus.stop()
+
+
+def create_sessions(user_count: int) -> List[Tuple[str, str]]:
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+
+    from src.launcher_app.models import OAuthSessionState
+
+    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+    session_cookies = []
+    for index in range(user_count):
+        user, _ = get_user_model().objects.get_or_create(username=f"user{index}@example.com")
+        # Each user has their own Galaxy API key, so each one gets their own pooled Galaxy connection.
+        OAuthSessionState.objects.update_or_create(
+            user=user, defaults={"galaxy_api_key": f"api-key-{index}", "session_type": "ucams"}
+        )
+
+        session = session_store()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        session_cookies.append((settings.SESSION_COOKIE_NAME, session.session_key))
+
+    return session_cookies
+
+
+@contextmanager
+def serve_dashboard(workers: int, directory: str) -> Iterator[Tuple[str, str]]:
+    with socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+    # The dashboard only accepts requests for its allowed hosts.
+    host = f"localhost:{port}"
+
+    log_path = os.path.join(directory, "gunicorn.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                "benchmarks.load_asgi:application",
+                "-k",
+                "uvicorn.workers.UvicornWorker",
+                "-w",
+                str(workers),
+                "--bind",
+                f"127.0.0.1:{port}",
+            ],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            wait_for_dashboard(url, host, process, log_path)
+            yield url, host
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def wait_for_dashboard(url: str, host: str, process: subprocess.Popen, log_path: str) -> None:
+    deadline = monotonic() + SERVER_START_TIMEOUT
+    with Client(base_url=url, headers={"Host": host}) as client:
+        while monotonic() < deadline and process.poll() is None:
+            try:
+                if client.get("/api/notification/").status_code == 200:
+                    return
+            except HTTPError:
+                pass
+            time.sleep(0.2)
+
+    with open(log_path) as log:
+        raise RuntimeError(f"The dashboard didn't start:\n{log.read()}")
+
+
+def print_summary(steps: List[Dict[str, Any]]) -> None:
+    print(
+        f"{'users':>6} {'endpoint':<32} {'req/s':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'errors':>8}", file=sys.stderr
+    )
+    for step in steps:
+        for endpoint, result in [*step["endpoints"].items(), ("total", step["total"])]:
+            if not result["requests"]:
+                continue
+            print(
+                f"{step['users']:>6} {endpoint:<32} {result['throughput']:>8.1f} "
+                f"{result['p50'] * 1000:>8.1f}ms {result['p95'] * 1000:>8.1f}ms {result['p99'] * 1000:>8.1f}ms "
+                f"{result['error_rate']:>8.2%}",
+                file=sys.stderr,
+            )
+        print(f"{step['users']:>6} {'sustained' if step['sustained'] else 'not sustained'}", file=sys.stderr)
+
+
+def main() -> None:
+    args = parse_args()
+    if find_spec("gunicorn") is None or find_spec("uvicorn") is None:
+        sys.exit("The load test requires gunicorn and uvicorn-worker: poetry run pip install gunicorn uvicorn-worker")
+
+    urls: "Queue[Tuple[str, str]]" = Queue()
+    stop = Event()
+    fakes = Process(target=serve_fakes, args=(args, urls, stop), daemon=True)
+    fakes.start()
+    try:
+        galaxy_url, prometheus_url = urls.get(timeout=SERVER_START_TIMEOUT)
+        with TemporaryDirectory() as directory:
+            configure_environment(directory, galaxy_url, prometheus_url)
+            if args.database_url:
+                os.environ["DATABASE_URL"] = args.database_url
+
+            import django
+            from django.core.management import call_command
+            from django.db import connections
+
+            django.setup()
+            call_command("migrate", verbosity=0)
+            session_cookies = create_sessions(max(args.users))
+            connections.close_all()
+
+            with serve_dashboard(args.workers, directory) as (url, host):
+                steps = [run(simulate(url, host, session_cookies[:count], args)) for count in args.users]
+    finally:
+        stop.set()
+        fakes.join()
+
+    report = {
+        **get_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "steps": steps,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    print_summary(steps)
+
+
+if __name__ == "__main__":
+    main()
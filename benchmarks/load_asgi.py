@@ -0,0 +1,26 @@
+"""ASGI entry point that the load test serves the dashboard from.
+
+nova-galaxy drops the port from the Galaxy URL when it connects, which would send the dashboard's Galaxy connections to
+port 80 instead of the fake Galaxy's random port. This is the dashboard's application, except that its pooled Galaxy
+connections keep the configured URL.
+"""
+
+from django.conf import settings
+from nova.galaxy import Connection
+
+from src.launcher_app import pool
+from src.launcher_app.asgi import application
+
+
+class FakeGalaxyConnection(Connection):
+    """Galaxy connection that keeps the port of GALAXY_URL."""
+
+    def __init__(self, galaxy_url: str, galaxy_key: str):
+        """Init."""
+        super().__init__(galaxy_url, galaxy_key)
+        self.galaxy_url = settings.GALAXY_URL
+
+
+pool.Connection = FakeGalaxyConnection  # type: ignore[misc]
+
+__all__ = ["application"]
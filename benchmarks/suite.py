@@ -0,0 +1,178 @@
+"""Defines the benchmarks and how they are measured.
+
+This module imports the dashboard, so Django must be set up before it is imported (see __main__.py).
+"""
+
+import os
+from asyncio import AbstractEventLoop, iscoroutine
+from functools import partial
+from statistics import mean, median, quantiles
+from tempfile import mkdtemp
+from time import monotonic, perf_counter, time_ns
+from typing import Any, Callable, Dict, List, Optional
+
+from bioblend.galaxy import GalaxyInstance
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory
+from nova.galaxy.connection import ConnectionHelper
+
+from src.launcher_app.auth import AuthManager
+from src.launcher_app.galaxy import GalaxyManager
+from src.launcher_app.models import OAuthSessionState
+from src.launcher_app.pool import PooledConnection, connection_pool
+from src.launcher_app.status import StatusManager
+
+from .fakes import DATA_HISTORY_ID, DATAFILE_TOOLS_HISTORY_ID, HISTORY_ID, FakeGalaxy, create_alerts, create_targets
+
+API_KEY = "benchmark-api-key"
+
+
+class Suite:
+    """Runs the benchmarks against the fake services and collects their results."""
+
+    def __init__(self, loop: AbstractEventLoop, galaxy: FakeGalaxy, options: Dict[str, Any]):
+        """Init."""
+        self.loop = loop
+        self.galaxy = galaxy
+        self.options = options
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self) -> List[Dict[str, Any]]:
+        galaxy_manager = self.create_galaxy_manager()
+        status_manager = StatusManager()
+
+        self.measure("get_tools", {"cached": False}, galaxy_manager.refresh_tools)
+        self.measure("get_tools", {"cached": True}, galaxy_manager.get_tools)
+
+        for job_count in self.options["job_counts"]:
+            self.galaxy.running_jobs = job_count
+            # A cold scan probes every job, while a warm scan reuses the probes of jobs that are already ready.
+            self.measure(
+                "monitor_jobs", {"jobs": job_count, "probes_cached": False}, self.monitor(galaxy_manager), cache.clear
+            )
+            self.measure("monitor_jobs", {"jobs": job_count, "probes_cached": True}, self.monitor(galaxy_manager))
+        self.galaxy.running_jobs = 0
+
+        for file_count in self.options["file_counts"]:
+            inputs = self.create_input_files(file_count)
+            # Changed files are registered with Galaxy again, while unchanged files reuse their datasets.
+            self.measure(
+                "launch_job",
+                {"files": file_count, "files_changed": True},
+                partial(galaxy_manager.launch_job, "nova_benchmark_tool", inputs),
+                partial(self.touch_input_files, inputs),
+            )
+            self.measure(
+                "launch_job",
+                {"files": file_count, "files_changed": False},
+                partial(galaxy_manager.launch_job, "nova_benchmark_tool", inputs),
+            )
+
+        for kind in ["alerts", "targets"]:
+            self.measure("status_fetch", {"kind": kind}, partial(status_manager.fetch, kind))
+        alerts = create_alerts(self.options["alert_count"])
+        self.measure("status_process", {"kind": "alerts"}, lambda: status_manager.process_alerts(alerts))
+        targets = create_targets(self.options["target_count"])
+        self.measure("status_process", {"kind": "targets"}, lambda: status_manager.process_targets(targets))
+
+        return self.results
+
+    def measure(
+        self,
+        name: str,
+        params: Dict[str, Any],
+        benchmark: Callable[[], Any],
+        setup: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        if self.options["only"] and not any(only in name for only in self.options["only"]):
+            return
+
+        samples = []
+        # The first run warms up connections and caches, and isn't measured.
+        for iteration in range(self.options["iterations"] + 1):
+            if iteration == 1:
+                request_counts = dict(self.galaxy.request_counts)
+            if setup is not None:
+                setup()
+
+            start = perf_counter()
+            result = benchmark()
+            if iscoroutine(result):
+                self.loop.run_until_complete(result)
+            duration = perf_counter() - start
+
+            if iteration > 0:
+                samples.append(duration)
+
+        # The number of requests to Galaxy per run shows regressions that the fake Galaxy's low latency could hide.
+        galaxy_requests = {
+            route: (count - request_counts.get(route, 0)) / len(samples)
+            for route, count in sorted(self.galaxy.request_counts.items())
+            if count > request_counts.get(route, 0)
+        }
+        self.results.append(
+            {"name": name, "params": params, **summarize(samples), "galaxy_requests_per_run": galaxy_requests}
+        )
+
+    def monitor(self, galaxy_manager: GalaxyManager) -> Callable[[], Any]:
+        async def monitor_jobs() -> None:
+            jobs = await galaxy_manager.monitor_jobs({})
+            if len(jobs) != self.galaxy.running_jobs or not all(job["url_ready"] for job in jobs):
+                raise RuntimeError(f"Expected {self.galaxy.running_jobs} ready jobs, but got {jobs}")
+
+        return monitor_jobs
+
+    def create_galaxy_manager(self) -> GalaxyManager:
+        user, _ = get_user_model().objects.get_or_create(username="benchmark@example.com")
+        OAuthSessionState.objects.update_or_create(
+            user=user, defaults={"galaxy_api_key": API_KEY, "session_type": "ucams"}
+        )
+
+        # nova-galaxy drops the port from the Galaxy URL when it connects, so the pooled connection to the fake Galaxy
+        # is created directly. Connecting isn't part of any benchmark.
+        connection = PooledConnection.__new__(PooledConnection)
+        connection.api_key = API_KEY
+        connection.last_used = monotonic()
+        connection.helper = ConnectionHelper(GalaxyInstance(url=self.galaxy.url, key=API_KEY), self.galaxy.url)
+        connection.history_ids = {
+            settings.GALAXY_HISTORY_NAME: HISTORY_ID,
+            f"{settings.GALAXY_HISTORY_NAME}_datafile_tools": DATAFILE_TOOLS_HISTORY_ID,
+            f"{settings.GALAXY_HISTORY_NAME}_data": DATA_HISTORY_ID,
+        }
+        connection_pool._connections[API_KEY] = connection
+
+        request = RequestFactory().get("/")
+        request.user = user
+
+        return GalaxyManager(AuthManager(request))
+
+    def create_input_files(self, file_count: int) -> Dict[str, str]:
+        directory = mkdtemp(dir=self.options["directory"])
+        inputs = {}
+        for index in range(file_count):
+            path = os.path.join(directory, f"run_{index}.nxs")
+            with open(path, "wb") as data_file:
+                data_file.write(b"\0" * 1024)
+            inputs[f"input_{index}"] = f"file_{path}"
+
+        return inputs
+
+    def touch_input_files(self, inputs: Dict[str, str]) -> None:
+        timestamp = time_ns()
+        for value in inputs.values():
+            os.utime(value.removeprefix("file_"), ns=(timestamp, timestamp))
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    return {
+        "iterations": len(samples),
+        "unit": "seconds",
+        "min": min(samples),
+        "mean": mean(samples),
+        "median": median(samples),
+        "p95": quantiles(samples, n=20, method="inclusive")[18] if len(samples) > 1 else samples[0],
+        "max": max(samples),
+        "samples": samples,
+    }
@@ -5,4 +5,8 @@ cd /opt/run/django
 envsubst '$UCAMS_REDIRECT_PATH $XCAMS_REDIRECT_PATH' < /etc/nginx/nginx.conf.template > /etc/nginx/nginx.conf
 service nginx restart
 poetry run python manage.py migrate
+# Each worker writes its metrics to this directory. Metrics from a previous run must not be reported again.
+export PROMETHEUS_MULTIPROC_DIR=/tmp/nova-dashboard-metrics
+rm -rf $PROMETHEUS_MULTIPROC_DIR
+mkdir -p $PROMETHEUS_MULTIPROC_DIR
 poetry run python -m gunicorn src.launcher_app.asgi:application -k uvicorn.workers.UvicornWorker -w 4
@@ -13,3 +13,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "src.launcher_app.settings")
 
 application = get_asgi_application()
+
+# Imported after the application is set up, since it needs the models to be loaded.
+from .pruning import start_pruning  # noqa: E402
+
+start_pruning()
@@ -4,42 +4,75 @@ The UCAMS/XCAMS OAuth providers must be configured via your .env file. See
 .env.sample for the available configuration options.
 """
 
-from typing import Any
+from datetime import timedelta
+from functools import cached_property
+from time import monotonic, sleep
+from typing import Any, Set
 
 from cryptography.fernet import Fernet
 from django.conf import settings
 from django.contrib.auth import get_user_model, login
+from django.contrib.auth.models import AbstractBaseUser
+from django.core.cache import cache
 from django.http import HttpRequest
 from django.utils.crypto import get_random_string
+from django.utils.timezone import now
 from jwt import decode
 from requests import get as requests_get
 from requests.auth import HTTPBasicAuth
 from requests_oauthlib import OAuth2Session
 
+from .caching import acquire
+from .clients import get_async_client
+from .metrics import track_upstream
 from .models import OAuthSessionState
 
+# Number of seconds before an access token expires that it is refreshed, so that it doesn't expire while in use.
+ACCESS_TOKEN_EXPIRY_MARGIN = 60
+# Number of seconds that a logged in user's session state is cached for.
+OAUTH_STATE_CACHE_TIMEOUT = 60
+# Number of seconds that a token refresh may take before it fails, which also bounds how long it holds its lock.
+TOKEN_REFRESH_TIMEOUT = 30
+# Number of seconds that a request waits for another request to refresh the user's tokens. Async views run this code
+# on a shared thread, so waiting blocks other requests in the same worker and must be short.
+TOKEN_REFRESH_WAIT_TIMEOUT = 5
+# Number of seconds between checks for a token that another request is refreshing.
+TOKEN_REFRESH_POLL_INTERVAL = 0.1
+
 
 class AuthManager:
     """Class to manage Authentication for the Dashboard."""
 
     def __init__(self, request: HttpRequest):
         """Init."""
+        # Fields of the session state that have been changed since it was last saved. Each operation saves all of its
+        # changes at once when it finishes.
+        self.dirty_fields: Set[str] = set()
+
         if request.user.is_authenticated:
-            self.oauth_state = OAuthSessionState.objects.get(user=request.user)
+            self.oauth_state = self.get_user_oauth_state(request.user)
         else:
             try:
                 self.oauth_state = OAuthSessionState.objects.get(state_param=request.GET["state"])
             except (KeyError, OAuthSessionState.DoesNotExist):
-                self.oauth_state = OAuthSessionState.objects.create(state_param=self.create_state_param())
+                # Anonymous visitors don't get a stored state until they start logging in (see start_login), so that
+                # page loads don't write to the database.
+                self.oauth_state = OAuthSessionState(state_param=self.create_state_param())
 
-        self.ucams_session = OAuth2Session(
+    @cached_property
+    def ucams_session(self) -> OAuth2Session:
+        # Most requests never talk to the OAuth providers, so their sessions are only created when needed.
+        return OAuth2Session(
             settings.UCAMS_CLIENT_ID,
             auto_refresh_url=settings.UCAMS_TOKEN_URL,
             redirect_uri=settings.BASE_URL + f"/{settings.UCAMS_REDIRECT_PATH}",
             scope=settings.UCAMS_SCOPES.split(" "),
             token_updater=self.save_access_token,
         )
-        self.xcams_session = OAuth2Session(
+
+    @cached_property
+    def xcams_session(self) -> OAuth2Session:
+        return OAuth2Session(
             settings.XCAMS_CLIENT_ID,
             auto_refresh_url=settings.XCAMS_TOKEN_URL,
             redirect_uri=settings.BASE_URL + f"/{settings.XCAMS_REDIRECT_PATH}",
@@ -47,12 +80,27 @@ class AuthManager:
             token_updater=self.save_access_token,
         )
 
+    def get_user_oauth_state(self, user: AbstractBaseUser) -> OAuthSessionState:
+        # Logged in users authenticate every few seconds while the dashboard monitors their jobs, so their state is
+        # cached. The cached state is invalidated whenever it is saved or deleted.
+        cache_key = OAuthSessionState.get_cache_key(user.pk)
+        oauth_state = cache.get(cache_key)
+        if oauth_state is None:
+            oauth_state = OAuthSessionState.objects.get(user=user)
+            cache.set(cache_key, oauth_state, timeout=OAUTH_STATE_CACHE_TIMEOUT)
+
+        return oauth_state
+
     def create_state_param(self) -> str:
         return get_random_string(length=128)
 
+    def start_login(self) -> None:
+        # The state is sent to the OAuth provider, which passes it back to the redirect handler.
+        self.oauth_state = OAuthSessionState.objects.create(state_param=self.create_state_param())
+
     def delete_galaxy_api_key(self) -> None:
-        self.oauth_state.galaxy_api_key = ""
-        self.oauth_state.save()
+        self.update_state(galaxy_api_key="")
+        self.flush()
 
     def login(self, request: HttpRequest, email: str, given_name: str) -> None:
         try:
@@ -63,15 +111,18 @@ class AuthManager:
         login(request, user)
 
         # Removing old session states both reduces the size of the database over
-        # time and allows us to make OAuthSessionState.user a OneToOneField.
-        OAuthSessionState.objects.filter(user=user).delete()
+        # time and allows us to make OAuthSessionState.user a OneToOneField. A
+        # user who logs in again while still logged in is updating their current
+        # state, which must be kept so that flush can save the changes to it.
+        OAuthSessionState.objects.filter(user=user).exclude(pk=self.oauth_state.pk).delete()
 
-        self.oauth_state.user = user
-        self.oauth_state.save()
+        # This also saves the tokens from redirect_handler.
+        self.update_state(user=user)
+        self.flush()
 
     def redirect_handler(self, request: HttpRequest, session_type: str) -> dict[str, Any]:
-        self.oauth_state.session_type = session_type
-        self.oauth_state.save()
+        # The changes made here are saved by login, which always follows.
+        self.update_state(session_type=session_type)
 
         match session_type:
             case "ucams":
@@ -87,20 +138,31 @@ class AuthManager:
                     client_secret=settings.XCAMS_CLIENT_SECRET,
                 )
 
-        self.save_access_token(tokens["access_token"])
-        self.save_refresh_token(tokens["refresh_token"])
+        self.save_tokens(tokens)
 
         return decode(tokens["id_token"], options={"verify_signature": False})
 
-    def get_galaxy_api_key(self) -> str:
+    async def verify_galaxy_api_key(self) -> bool:
+        # Checks the cached API key with a single request to Galaxy, without refreshing the user's tokens.
         if self.oauth_state.galaxy_api_key == "":
-            access_token = self.get_access_token()
-            response = requests_get(
-                f"{settings.GALAXY_URL}{settings.GALAXY_API_KEY_ENDPOINT}",
-                headers={"Authorization": f"Bearer {access_token}"},
+            return False
+
+        with track_upstream("galaxy_verify_api_key"):
+            response = await get_async_client().get(
+                f"{settings.GALAXY_URL}/api/users/current", headers={"x-api-key": self.oauth_state.galaxy_api_key}
             )
+        # Galaxy responds to an invalid key with an error or, in some versions, with the anonymous user.
+        return response.status_code == 200 and "id" in response.json()
 
-            data = response.json()
+    def get_galaxy_api_key(self) -> str:
+        if self.oauth_state.galaxy_api_key == "":
+            access_token = self.get_access_token()
+            with track_upstream("galaxy_api_key"):
+                response = requests_get(
+                    f"{settings.GALAXY_URL}{settings.GALAXY_API_KEY_ENDPOINT}",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                )
+                data = response.json()
             if "err_msg" in data:
                 if data["err_msg"].startswith("Cannot locate user by access token."):
                     data["err_msg"] = (
@@ -109,44 +171,104 @@ class AuthManager:
                     )
                 raise Exception(data["err_msg"])
 
-            self.oauth_state.galaxy_api_key = response.json()["api_key"]
-            self.oauth_state.save()
+            self.update_state(galaxy_api_key=response.json()["api_key"])
+            self.flush()
 
         return self.oauth_state.galaxy_api_key
 
     def get_access_token(self) -> str:
-        match self.oauth_state.session_type:
-            case "ucams":
-                tokens = self.ucams_session.refresh_token(
-                    settings.UCAMS_TOKEN_URL,
-                    auth=HTTPBasicAuth(settings.UCAMS_CLIENT_ID, settings.UCAMS_CLIENT_SECRET),
-                    refresh_token=self.get_refresh_token(),
-                )
-            case "xcams":
-                tokens = self.xcams_session.refresh_token(
-                    settings.XCAMS_TOKEN_URL,
-                    auth=HTTPBasicAuth(settings.XCAMS_CLIENT_ID, settings.XCAMS_CLIENT_SECRET),
-                    refresh_token=self.get_refresh_token(),
-                )
+        if self.has_valid_access_token():
+            return self.oauth_state.access_token
 
-        self.save_access_token(tokens["access_token"])
-        self.save_refresh_token(tokens["refresh_token"])
+        # Refresh tokens can only be used once, so concurrent refreshes for the same user (including from other
+        # workers) are serialized by a lock. Requests that were waiting reuse the token from the first refresh. The
+        # lock is held in the cache rather than the database, so other writes don't wait for the OAuth provider.
+        lock_key = f"oauth_token_refresh:{self.oauth_state.pk}"
+        deadline = monotonic() + TOKEN_REFRESH_WAIT_TIMEOUT
+        while not acquire(lock_key, TOKEN_REFRESH_TIMEOUT):
+            if monotonic() >= deadline:
+                raise Exception("Your login is being refreshed by another request. Please try again.")
+
+            sleep(TOKEN_REFRESH_POLL_INTERVAL)
+            self.reload_state()
+            if self.has_valid_access_token():
+                return self.oauth_state.access_token
+
+        try:
+            # The token may have been refreshed between the first check and acquiring the lock.
+            self.reload_state()
+            if self.has_valid_access_token():
+                return self.oauth_state.access_token
+
+            with track_upstream("oauth_token_refresh"):
+                match self.oauth_state.session_type:
+                    case "ucams":
+                        tokens = self.ucams_session.refresh_token(
+                            settings.UCAMS_TOKEN_URL,
+                            auth=HTTPBasicAuth(settings.UCAMS_CLIENT_ID, settings.UCAMS_CLIENT_SECRET),
+                            refresh_token=self.get_refresh_token(),
+                            timeout=TOKEN_REFRESH_TIMEOUT,
+                        )
+                    case "xcams":
+                        tokens = self.xcams_session.refresh_token(
+                            settings.XCAMS_TOKEN_URL,
+                            auth=HTTPBasicAuth(settings.XCAMS_CLIENT_ID, settings.XCAMS_CLIENT_SECRET),
+                            refresh_token=self.get_refresh_token(),
+                            timeout=TOKEN_REFRESH_TIMEOUT,
+                        )
+
+            self.save_tokens(tokens)
+            self.flush()
+        finally:
+            cache.delete(lock_key)
 
         return self.oauth_state.access_token
 
+    def reload_state(self) -> None:
+        self.oauth_state = OAuthSessionState.objects.get(pk=self.oauth_state.pk)
+        self.dirty_fields.clear()
+
+    def has_valid_access_token(self) -> bool:
+        expiry = self.oauth_state.access_token_expiry
+        return (
+            self.oauth_state.access_token != ""
+            and expiry is not None
+            and expiry > now() + timedelta(seconds=ACCESS_TOKEN_EXPIRY_MARGIN)
+        )
+
     def get_refresh_token(self) -> str:
         return Fernet(settings.REFRESH_TOKEN_KEY).decrypt(self.oauth_state.refresh_token.encode()).decode()
 
     def get_ucams_auth_url(self) -> str:
-        return self.ucams_session.authorization_url(settings.UCAMS_AUTH_URL)[0]
+        return self.ucams_session.authorization_url(settings.UCAMS_AUTH_URL, state=self.oauth_state.state_param)[0]
 
     def get_xcams_auth_url(self) -> str:
-        return self.xcams_session.authorization_url(settings.XCAMS_AUTH_URL)[0]
+        return self.xcams_session.authorization_url(settings.XCAMS_AUTH_URL, state=self.oauth_state.state_param)[0]
 
     def save_access_token(self, token: str) -> None:
-        self.oauth_state.access_token = token
-        self.oauth_state.save()
+        self.update_state(access_token=token)
+
+    def save_tokens(self, tokens: dict[str, Any]) -> None:
+        # Tokens without a known lifetime are refreshed every time they are needed.
+        expires_in = tokens.get("expires_in")
+        self.update_state(access_token_expiry=now() + timedelta(seconds=float(expires_in)) if expires_in else None)
+
+        self.save_access_token(tokens["access_token"])
+        self.save_refresh_token(tokens["refresh_token"])
 
     def save_refresh_token(self, token: str) -> None:
-        self.oauth_state.refresh_token = Fernet(settings.REFRESH_TOKEN_KEY).encrypt(token.encode()).decode()
-        self.oauth_state.save()
+        self.update_state(refresh_token=Fernet(settings.REFRESH_TOKEN_KEY).encrypt(token.encode()).decode())
+
+    def update_state(self, **fields: Any) -> None:
+        for field, value in fields.items():
+            setattr(self.oauth_state, field, value)
+        self.dirty_fields.update(fields.keys())
+
+    def flush(self) -> None:
+        # Only the changed fields are written, so this can't overwrite changes that other requests made to the rest
+        # of the session state.
+        if self.oauth_state.pk is None:
+            self.oauth_state.save()
+        elif self.dirty_fields:
+            self.oauth_state.save(update_fields=sorted(self.dirty_fields))
+        self.dirty_fields.clear()
@@ -0,0 +1,131 @@
+"""Helpers for caching expensive upstream results in the shared Django cache.
+
+The cache backend can be controlled via the CACHE_BACKEND and CACHE_LOCATION settings. The default file-based backend
+is shared by all server workers running on the same host.
+"""
+
+import fcntl
+import logging
+import os
+from asyncio import sleep as async_sleep
+from contextlib import contextmanager
+from threading import Lock, Thread
+from time import monotonic, time
+from typing import Any, Awaitable, Callable, Iterator
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Upper bound on how long a single caller may hold the lock for building a value. This prevents a crashed worker from
+# blocking other callers forever.
+REFRESH_LOCK_TIMEOUT = 120
+# Number of seconds between checks for a result that another worker is building.
+COALESCE_POLL_INTERVAL = 0.05
+
+# Serializes adds within this worker. The file-based backend checks whether a key exists and then writes it, so adds
+# are also serialized across workers with a lock on a file in the cache directory (see _lock_cache_directory). Backends
+# such as Redis and Memcached add keys atomically across workers.
+_add_lock = Lock()
+# The file-based backend only deletes files that end in .djcache, so this file is never culled or cleared.
+CACHE_DIRECTORY_LOCK_FILE = "acquire.lock"
+
+
+def acquire(lock_key: str, timeout: float) -> bool:
+    """Atomically acquires a lock stored in the cache, which expires after timeout seconds.
+
+    The lock is shared by all workers that share the cache.
+    """
+    with _add_lock, _lock_cache_directory():
+        return cache.add(lock_key, True, timeout=timeout)
+
+
+@contextmanager
+def _lock_cache_directory() -> Iterator[None]:
+    if not isinstance(caches[DEFAULT_CACHE_ALIAS], FileBasedCache):
+        yield
+        return
+
+    directory = settings.CACHES[DEFAULT_CACHE_ALIAS]["LOCATION"]
+    os.makedirs(directory, exist_ok=True)
+    # The lock is released when the file is closed, including if the worker crashes.
+    with open(os.path.join(directory, CACHE_DIRECTORY_LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+async def coalesce(key: str, window: float, builder: Callable[[], Awaitable[Any]], wait_timeout: float) -> Any:
+    """Shares the result of builder between concurrent callers, including callers in other workers.
+
+    The result is reused for window seconds after it was built. Callers that arrive while another caller is building
+    the result wait up to wait_timeout seconds for it rather than building it again.
+    """
+    if window <= 0:
+        return await builder()
+
+    entry = await cache.aget(key)
+    if entry is not None:
+        return entry["value"]
+
+    lock_key = f"{key}:building"
+    if await sync_to_async(acquire)(lock_key, REFRESH_LOCK_TIMEOUT):
+        try:
+            value = await builder()
+            await cache.aset(key, {"value": value}, timeout=window)
+
+            return value
+        finally:
+            await cache.adelete(lock_key)
+
+    deadline = monotonic() + wait_timeout
+    while monotonic() < deadline:
+        await async_sleep(COALESCE_POLL_INTERVAL)
+
+        building = await cache.aget(lock_key) is not None
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry["value"]
+        if not building:
+            # The other caller failed to build the result.
+            break
+
+    return await builder()
+
+
+async def get_or_refresh(key: str, ttl: int, builder: Callable[[], Awaitable[Any]]) -> Any:
+    """Returns the cached value for key, building it with builder if necessary.
+
+    If the cached value is older than ttl seconds, then the stale value is returned immediately while a single
+    background refresh (across all workers) rebuilds it.
+    """
+    entry = await cache.aget(key)
+    if entry is None:
+        return await refresh(key, builder)
+
+    if time() - entry["time"] > ttl and await sync_to_async(acquire)(f"{key}:refreshing", REFRESH_LOCK_TIMEOUT):
+        # The refresh runs on its own event loop so that it isn't tied to the lifetime of this request.
+        Thread(target=async_to_sync(_background_refresh), args=(key, builder), daemon=True).start()
+
+    return entry["value"]
+
+
+async def refresh(key: str, builder: Callable[[], Awaitable[Any]]) -> Any:
+    value = await builder()
+    await cache.aset(key, {"time": time(), "value": value}, timeout=None)
+
+    return value
+
+
+async def _background_refresh(key: str, builder: Callable[[], Awaitable[Any]]) -> None:
+    try:
+        await refresh(key, builder)
+    except Exception as e:
+        # The stale value will continue to be served until a refresh succeeds.
+        logger.error(f"Failed to refresh cached value for {key}: {e}")
+    finally:
+        await cache.adelete(f"{key}:refreshing")
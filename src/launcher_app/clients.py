@@ -0,0 +1,52 @@
+"""Defines shared asynchronous HTTP clients for requests to upstream services.
+
+Clients keep connections to Galaxy and Prometheus alive between requests. Connections can't be shared between event
+loops, so each event loop gets its own clients, which are closed when the event loop finishes. Synchronous code runs
+each async_to_sync call on a new event loop, so its clients only live as long as that call. The number of connections
+each client keeps open can be controlled via the HTTP_MAX_CONNECTIONS setting.
+"""
+
+from asyncio import AbstractEventLoop, Task, get_running_loop
+from typing import Dict, Set
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from httpx import AsyncClient, Limits
+
+# Clients are discarded along with their event loop.
+_clients: "WeakKeyDictionary[AbstractEventLoop, Dict[bool, AsyncClient]]" = WeakKeyDictionary()
+# The event loop only keeps weak references to its tasks.
+_closers: Set[Task] = set()
+
+
+def get_async_client(verify: bool = True) -> AsyncClient:
+    """Returns the client for the running event loop, optionally without TLS certificate verification."""
+    loop = get_running_loop()
+    loop_clients = _clients.get(loop)
+    if loop_clients is None:
+        loop_clients = _clients[loop] = {}
+        closer = loop.create_task(_close_clients(loop_clients))
+        _closers.add(closer)
+        closer.add_done_callback(_closers.discard)
+
+    if verify not in loop_clients:
+        loop_clients[verify] = AsyncClient(
+            limits=Limits(max_connections=settings.HTTP_MAX_CONNECTIONS),
+            # Matches requests, which doesn't time out by default. Callers set timeouts where they need them.
+            timeout=None,
+            verify=verify,
+        )
+
+    return loop_clients[verify]
+
+
+async def _close_clients(loop_clients: Dict[bool, AsyncClient]) -> None:
+    # Waits until the event loop finishes. asyncio.run (which async_to_sync and the server use) cancels any remaining
+    # tasks before it closes the loop, which closes the clients' open connections.
+    loop = get_running_loop()
+    try:
+        await loop.create_future()
+    finally:
+        _clients.pop(loop, None)
+        for client in loop_clients.values():
+            await client.aclose()
@@ -8,22 +8,204 @@ GALAXY_HISTORY_NAME setting.
 """
 
 import logging
-from time import sleep
-from typing import Any, Dict, List, Optional, TypedDict
-
-from bs4 import BeautifulSoup
+import os
+from asyncio import ensure_future, gather, wait
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
+from functools import partial
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+from json import JSONDecodeError
+from time import monotonic, sleep, time
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from bioblend import ConnectionError as BioblendConnectionError
 from django.conf import settings
-from nova.galaxy import Connection, Parameters, Tool
-from requests import get as requests_get
-
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.utils.timezone import now
+from httpx import HTTPError, HTTPStatusError, TransportError
+from nova.galaxy import Parameters, Tool
+from nova.galaxy.connection import ConnectionHelper
+from nova.galaxy.data_store import Datastore
+from nova.galaxy.job import WorkState
+from requests import ConnectionError as RequestsConnectionError
+
+from . import caching
 from .auth import AuthManager
+from .clients import get_async_client
+from .metrics import GALAXY_FAILURES, track_upstream
+from .models import GalaxyHistory, IngestedFile
+from .pool import connection_pool
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
+TOOLS_CACHE_KEY = "galaxy_tools"
 TERMINAL_STATES = ["deleted", "deleting", "error", "ok"]
 NONTERMINAL_STATES = ["deleted_new", "failed", "new", "paused", "queued", "resubmitted", "running", "upload", "waiting"]
+PLACEHOLDER_PAGE_SENTINELS = [
+    b"Proxy target missing",  # Avoid the proxy target missing page appearing
+    b"Javascript Required for Galaxy",  # Avoid the Galaxy homepage appearing
+]
+PROBE_CACHE_TIMEOUT = 60 * 60 * 24
+LAUNCH_TICKET_TIMEOUT = 60 * 60
+LAUNCH_POLL_INITIAL_DELAY = 0.1
+LAUNCH_POLL_MAX_DELAY = 2.0
+# Launches can wait for a launch worker before they get GALAXY_LAUNCH_TIMEOUT to register their files and have Galaxy
+# accept the job. A ticket still pending after this much longer belongs to a launch that was lost, e.g. by a restart.
+LAUNCH_PENDING_MARGIN = 60
+
+# Launches block on Galaxy while input files are registered and the job is submitted, so they run in the background
+# and are tracked through tickets instead of holding the request open.
+launch_executor = ThreadPoolExecutor(max_workers=settings.GALAXY_LAUNCH_WORKERS, thread_name_prefix="galaxy-launch")
+# Launches wait on file registrations, so these need their own pool to avoid launches waiting on queued registrations
+# that can't start.
+ingest_executor = ThreadPoolExecutor(max_workers=settings.GALAXY_INGEST_WORKERS, thread_name_prefix="galaxy-ingest")
+# Descriptions of the tools in the most recently built tool list, keyed by tool ID and version. Galaxy only changes a
+# tool's help with a new version, so rebuilding the tool list doesn't need to parse the help of unchanged tools again.
+_tool_descriptions: Dict[Tuple[str, str], str] = {}
+
+
+def get_galaxy_error_message(exception: Exception) -> str:
+    message = str(exception)
+    if isinstance(exception, JSONDecodeError):
+        message = f"Unable to fetch tool list, {settings.GALAXY_URL} may be restarting."
+    if isinstance(exception, (RequestsConnectionError, TransportError)) or "502 Bad Gateway" in message:
+        message = f"Unable to connect to Galaxy, {settings.GALAXY_URL} may be restarting."
+
+    return message
+
+
+def create_galaxy_manager(request: HttpRequest) -> "GalaxyManager":
+    # Authenticating with Galaxy blocks on the database and on Galaxy, so async callers run this in a thread.
+    return GalaxyManager(AuthManager(request))
+
+
+async def get_launch_ticket(ticket_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    return (await get_launch_tickets([ticket_id], user_id))[ticket_id]
+
+
+async def get_launch_tickets(ticket_ids: List[str], user_id: int) -> Dict[str, Optional[Dict[str, Any]]]:
+    tickets = await cache.aget_many([f"galaxy_launch:{ticket_id}" for ticket_id in ticket_ids])
+
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    for ticket_id in ticket_ids:
+        ticket = tickets.get(f"galaxy_launch:{ticket_id}")
+        # Users can only see their own launches.
+        if ticket is None or ticket["user_id"] != user_id:
+            results[ticket_id] = None
+        elif (
+            ticket["state"] == "pending"
+            and time() > ticket["created"] + settings.GALAXY_LAUNCH_TIMEOUT + LAUNCH_PENDING_MARGIN
+        ):
+            results[ticket_id] = {**ticket, "state": "failed", "error": "Galaxy didn't accept the job in time."}
+        else:
+            results[ticket_id] = ticket
+
+    return results
+
+
+class _StopParsingError(Exception):
+    pass
+
+
+class ToolHelpParser(HTMLParser):
+    """Extracts the first line of text from a tool's help HTML.
+
+    Tool help can be long, so parsing stops as soon as the first line is complete. The text of comments and of elements
+    that aren't displayed is skipped, and whitespace between elements is collapsed. Character references are resolved
+    the same way as BeautifulSoup's html.parser builder, which the tool list used to be built with.
+    """
+
+    # The text of these elements isn't displayed as part of the help.
+    HIDDEN_TAGS = ["rp", "rt", "script", "style", "template"]
+    # Whitespace is kept as is inside these elements.
+    PREFORMATTED_TAGS = ["pre", "textarea"]
+
+    def __init__(self) -> None:
+        """Init."""
+        # html.unescape() would also resolve references without a semicolon that are followed by more letters (e.g.
+        # "&ampx"), so references are resolved as the parser finds them instead.
+        super().__init__(convert_charrefs=False)
+        self.text: List[str] = []
+        # Text since the last tag. Whitespace is only collapsed once all of it has been read.
+        self.pending_text: List[str] = []
+        self.open_tags: List[str] = []
+
+    def parse(self, tool_help: str) -> str:
+        try:
+            self.feed(tool_help)
+            self.close()
+            self._end_text()
+        except _StopParsingError:
+            pass
+
+        return "".join(self.text).strip().split("\n")[0].strip()
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self._end_text()
+        # Elements without an end tag, like <br>, stay open, which doesn't affect the text.
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._end_text()
+        # An end tag also closes any elements that were opened after its start tag.
+        if tag in self.open_tags:
+            del self.open_tags[len(self.open_tags) - self.open_tags[::-1].index(tag) - 1 :]
+
+    def handle_data(self, data: str) -> None:
+        self.pending_text.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        # Names that aren't entities (e.g. "&T" in "AT&T") are kept as text.
+        self.handle_data(html5.get(f"{name};", f"&{name}"))
+
+    def handle_charref(self, name: str) -> None:
+        code = int(name[1:], 16) if name[0] in "xX" else int(name)
+        if 0 < code <= 0x10FFFF and not 0xD800 <= code <= 0xDFFF:
+            # unescape() replaces the control characters that windows-1252 assigns printable characters to.
+            self.handle_data(unescape(f"&#{code};") or chr(code))
+        else:
+            self.handle_data("\ufffd")
+
+    def handle_comment(self, data: str) -> None:
+        self._end_text()
+
+    def handle_decl(self, decl: str) -> None:
+        self._end_text()
+
+    def handle_pi(self, data: str) -> None:
+        self._end_text()
+
+    def unknown_decl(self, data: str) -> None:
+        self._end_text()
+        if data.upper().startswith("CDATA["):
+            self.handle_data(data[len("CDATA[") :])
+            # BeautifulSoup keeps CDATA text even inside hidden elements.
+            self._end_text(hidden=False)
+
+    def _end_text(self, hidden: Optional[bool] = None) -> None:
+        data = "".join(self.pending_text)
+        self.pending_text.clear()
+        if hidden is None:
+            hidden = any(tag in self.HIDDEN_TAGS for tag in self.open_tags)
+        if not data or hidden:
+            return
+        preformatted = any(tag in self.PREFORMATTED_TAGS for tag in self.open_tags)
+        if not preformatted and not data.strip(" \t\n\f\r"):
+            data = "\n" if "\n" in data else " "
+
+        self.text.append(data)
+        # Leading blank lines don't end the first line.
+        if "\n" in data and "\n" in "".join(self.text).lstrip():
+            raise _StopParsingError()
 
 
 class ToolDict(TypedDict):
@@ -47,28 +229,97 @@ class GalaxyManager:
         """Init."""
         if auth_manager is not None:
             self.auth_manager = auth_manager
-            self.connection = Connection(settings.GALAXY_URL, self.auth_manager.get_galaxy_api_key())
-            with self.connection.connect() as connection:
-                connection.create_data_store(name=settings.GALAXY_HISTORY_NAME)
+            # Connections are pooled per API key so that repeated requests from the same user don't need to
+            # reconnect to Galaxy.
+            self.connection = connection_pool.acquire(self.auth_manager.get_galaxy_api_key())
 
     def _handle_galaxy_failure(self, exception: Exception) -> None:
         logger.error(f"Failed to connect to Galaxy: {exception}")
+        GALAXY_FAILURES.inc()
 
+        connection_pool.discard(self.connection.api_key)
         self.auth_manager.delete_galaxy_api_key()
 
         raise Exception(f"Failed to connect to Galaxy: {exception}") from None
 
-    def _parse_tool_help(self, tool_help: str) -> str:
-        soup = BeautifulSoup(tool_help, "html.parser")
-
-        # Grab only the first line of the help text.
-        return soup.get_text().strip().split("\n")[0].strip()
-
-    def get_tools(self) -> Dict[str, ToolDict]:
+    def _get_data_store(self, connection: ConnectionHelper, name: str) -> Datastore:
+        return Datastore(name, connection, self._get_history_id(name))
+
+    def _get_history_id(self, name: str) -> str:
+        # History IDs never change, so they are only resolved by name the first time the user needs them.
+        history_id = self.connection.history_ids.get(name)
+        if history_id is None:
+            user_id = self.auth_manager.oauth_state.user_id  # type: ignore
+            history = GalaxyHistory.objects.filter(user_id=user_id, name=name).first()
+            if history:
+                history_id = history.history_id
+            else:
+                with self.connection.connect() as connection, track_upstream("galaxy_create_data_store"):
+                    history_id = connection.create_data_store(name=name).history_id
+                # Saved with a single upsert, like registered files (see _save_ingested_dataset).
+                GalaxyHistory.objects.bulk_create(
+                    [GalaxyHistory(user_id=user_id, name=name, history_id=history_id)],
+                    update_conflicts=True,
+                    unique_fields=["user", "name"],
+                    update_fields=["history_id"],
+                )
+            self.connection.history_ids[name] = history_id
+
+        return history_id
+
+    async def _aget_history_id(self, name: str) -> str:
+        history_id = self.connection.history_ids.get(name)
+        if history_id is None:
+            history_id = await sync_to_async(self._get_history_id)(name)
+
+        return history_id
+
+    def _forget_histories(self) -> None:
+        # Forces the histories to be resolved by name again in case they were deleted in Galaxy. Registered datasets
+        # that were deleted along with them are detected when they are next reused (see _get_ingested_dataset).
+        user_id = self.auth_manager.oauth_state.user_id  # type: ignore
+        self.connection.history_ids.clear()
+        GalaxyHistory.objects.filter(user_id=user_id).delete()
+
+    def _is_missing_history(self, exception: Exception) -> bool:
+        status_code: Optional[int]
+        if isinstance(exception, HTTPStatusError):
+            status_code, body = exception.response.status_code, exception.response.text
+        elif isinstance(exception, BioblendConnectionError):
+            status_code, body = exception.status_code, str(exception.body)
+        else:
+            return False
+
+        return status_code in [400, 403, 404] and "histor" in body.lower()
+
+    def _get_tool_description(self, tool_id: str, tool_version: str, tool_help: str, reuse: bool) -> str:
+        key = (tool_id, tool_version)
+        description = _tool_descriptions.get(key) if reuse else None
+        if description is None:
+            # Grab only the first line of the help text.
+            description = ToolHelpParser().parse(tool_help)
+            _tool_descriptions[key] = description
+
+        return description
+
+    async def get_tools(self) -> Dict[str, ToolDict]:
+        # The tool list is identical for all users and rarely changes, so it's shared between all workers and only
+        # periodically refreshed.
+        return await caching.get_or_refresh(TOOLS_CACHE_KEY, settings.GALAXY_TOOLS_CACHE_TTL, self._build_tools)
+
+    async def refresh_tools(self) -> Dict[str, ToolDict]:
+        # The cached tool list is only replaced once the new one is built, so it is still served if Galaxy fails.
+        # Refreshing also picks up help that changed without a new tool version.
+        return await caching.refresh(TOOLS_CACHE_KEY, partial(self._build_tools, reuse_descriptions=False))
+
+    async def _build_tools(self, reuse_descriptions: bool = True) -> Dict[str, ToolDict]:
         tool_json: Dict[str, ToolDict] = {}
+        listed_tools = set()
 
         # Retrieve the tool name and help text from the Galaxy server.
-        galaxy_tools = requests_get(f"{settings.GALAXY_URL}/api/tools?tool_help=true").json()
+        with track_upstream("galaxy_tools"):
+            response = await get_async_client().get(f"{settings.GALAXY_URL}/api/tools?tool_help=true")
+            galaxy_tools = response.json()
         main_categories = []
 
         for galaxy_category in galaxy_tools:
@@ -106,9 +357,12 @@ class GalaxyManager:
                     continue
                 is_prototype_tool = "prototype" in tool_id
 
-                tool_description = self._parse_tool_help(tool.get("help", ""))
                 tool_name = tool.get("name", "Unnamed Tool")
                 tool_version = tool.get("version", "unversioned")
+                tool_description = self._get_tool_description(
+                    tool_id, tool_version, tool.get("help", ""), reuse_descriptions
+                )
+                listed_tools.add((tool_id, tool_version))
 
                 if is_prototype_tool:
                     tool_json[category_id]["prototype_tools"].append(
@@ -119,6 +373,11 @@ class GalaxyManager:
                         {"id": tool_id, "description": tool_description, "name": tool_name, "version": tool_version}
                     )
 
+        # Descriptions of removed tools and old versions won't be needed again.
+        for key in list(_tool_descriptions):
+            if key not in listed_tools:
+                _tool_descriptions.pop(key, None)
+
         # Galaxy returns the sections in a deterministic, but somewhat arbitrary order. This forces all of our main
         # categories to appear first in alphabetical order.
         ordered_json = {}
@@ -138,24 +397,156 @@ class GalaxyManager:
 
         return ordered_json
 
-    def ingest_file(self, connection: Connection, file_path: str) -> Optional[str]:
-        file_store = connection.create_data_store(name=f"{settings.GALAXY_HISTORY_NAME}_data")
+    def ingest_file(self, connection: ConnectionHelper, file_path: str) -> Optional[str]:
+        # Users often relaunch tools against the same file, so an unchanged file reuses its previous dataset rather
+        # than being registered again.
+        fingerprint = self._get_file_fingerprint(file_path)
+        if fingerprint is not None:
+            dataset_id = self._get_ingested_dataset(connection, file_path, fingerprint)
+            if dataset_id is not None:
+                return dataset_id
+
+        file_store = self._get_data_store(connection, f"{settings.GALAXY_HISTORY_NAME}_data")
         load_data = Tool("neutrons_register")
         load_params = Parameters()
         load_params.add_input("series_0|input", file_path)
         outputs = load_data.run(file_store, load_params)
 
         try:
-            return outputs.data[0].id
+            dataset_id = outputs.data[0].id
         except Exception:
             return None
 
-    def launch_job(self, tool_id: str, inputs: dict[str, str]) -> str:
+        if fingerprint is not None:
+            self._save_ingested_dataset(file_path, fingerprint, dataset_id)
+
+        return dataset_id
+
+    def _get_file_fingerprint(self, file_path: str) -> Optional[Tuple[int, int]]:
+        # Files can only be reused if we can tell whether they changed since they were registered, which requires the
+        # file to be visible from this server.
+        try:
+            stat = os.stat(file_path.removeprefix("file_"))
+        except (OSError, ValueError):
+            return None
+
+        return stat.st_size, stat.st_mtime_ns
+
+    def _get_ingested_dataset(
+        self, connection: ConnectionHelper, file_path: str, fingerprint: Tuple[int, int]
+    ) -> Optional[str]:
+        user_id = self.auth_manager.oauth_state.user_id  # type: ignore
+        ingested_file = IngestedFile.objects.filter(user_id=user_id, path=file_path).first()
+        if ingested_file is None or (ingested_file.size, ingested_file.mtime_ns) != fingerprint:
+            return None
+
+        # The user may have deleted the dataset in Galaxy since it was registered.
+        try:
+            dataset = connection.galaxy_instance.datasets.show_dataset(ingested_file.dataset_id)
+        except BioblendConnectionError:
+            dataset = {}
+        if not dataset or dataset.get("deleted") or dataset.get("purged") or dataset.get("state") == "error":
+            ingested_file.delete()
+            return None
+
+        ingested_file.save(update_fields=["last_used"])
+
+        return ingested_file.dataset_id
+
+    def _save_ingested_dataset(self, file_path: str, fingerprint: Tuple[int, int], dataset_id: str) -> None:
+        user_id = self.auth_manager.oauth_state.user_id  # type: ignore
+        size, mtime_ns = fingerprint
+        # Files are registered concurrently. update_or_create() reads and then writes the row in one transaction, which
+        # SQLite fails instead of waiting if another write commits in between, so this is a single upsert instead.
+        IngestedFile.objects.bulk_create(
+            [IngestedFile(user_id=user_id, path=file_path, size=size, mtime_ns=mtime_ns, dataset_id=dataset_id)],
+            update_conflicts=True,
+            unique_fields=["user", "path"],
+            update_fields=["size", "mtime_ns", "dataset_id", "last_used"],
+        )
+
+        # Files that haven't been used in a while are unlikely to be used again.
+        cutoff = now() - timedelta(seconds=settings.GALAXY_INGEST_CACHE_MAX_AGE)
+        IngestedFile.objects.filter(user_id=user_id, last_used__lt=cutoff).delete()
+
+    def _ingest_files(self, inputs: dict[str, str], ingests: Dict[str, Future]) -> None:
+        for value in inputs.values():
+            if value.startswith("file_") and value not in ingests:
+                ingests[value] = ingest_executor.submit(self._ingest_file_in_background, value)
+
+    def _ingest_file_in_background(self, file_path: str) -> Optional[str]:
+        try:
+            with self.connection.connect() as connection:
+                return self.ingest_file(connection, file_path)
+        finally:
+            close_old_connections()
+
+    def submit_launch(self, tool_id: str, inputs: dict[str, str]) -> str:
+        return self.submit_launches([(tool_id, inputs)])[0]
+
+    def submit_launches(self, launches: List[Tuple[str, dict[str, str]]]) -> List[str]:
+        # Files are registered up front so that files used by several of the launches are only registered once.
+        ingests: Dict[str, Future] = {}
+        for _, inputs in launches:
+            self._ingest_files(inputs, ingests)
+
+        ticket_ids = []
+        for tool_id, inputs in launches:
+            ticket_id = uuid4().hex
+            created = time()
+            self._save_launch_ticket(ticket_id, "pending", created=created)
+            launch_executor.submit(self._run_launch, ticket_id, created, tool_id, inputs, ingests)
+            ticket_ids.append(ticket_id)
+
+        return ticket_ids
+
+    def _run_launch(
+        self, ticket_id: str, created: float, tool_id: str, inputs: dict[str, str], ingests: Dict[str, Future]
+    ) -> None:
+        try:
+            job_id = self.launch_job(tool_id, inputs, ingests)
+            self._save_launch_ticket(ticket_id, "submitted", created=created, job_id=job_id)
+        except Exception as e:
+            logger.error(f"Failed to launch {tool_id}: {e}")
+            self._save_launch_ticket(ticket_id, "failed", created=created, error=get_galaxy_error_message(e))
+        finally:
+            # This thread outlives the request, so Django won't clean up its database connection for us.
+            close_old_connections()
+
+    def _save_launch_ticket(
+        self, ticket_id: str, state: str, created: float, job_id: str = "", error: str = ""
+    ) -> None:
+        ticket = {
+            "user_id": self.auth_manager.oauth_state.user_id,  # type: ignore
+            "created": created,
+            "state": state,
+            "job_id": job_id,
+            "error": error,
+        }
+        cache.set(f"galaxy_launch:{ticket_id}", ticket, timeout=LAUNCH_TICKET_TIMEOUT)
+
+    def launch_job(self, tool_id: str, inputs: dict[str, str], ingests: Optional[Dict[str, Future]] = None) -> str:
+        try:
+            return self._launch_job(tool_id, inputs, {} if ingests is None else ingests)
+        except Exception as e:
+            if self._is_missing_history(e):
+                # The cached history IDs are stale, so they are resolved again by the next launch.
+                self._forget_histories()
+            raise
+
+    def _launch_job(self, tool_id: str, inputs: dict[str, str], ingests: Dict[str, Future]) -> str:
+        # Registering the files and submitting the job share a deadline, so a stalled registration can't keep this
+        # thread from other launches.
+        deadline = monotonic() + settings.GALAXY_LAUNCH_TIMEOUT
+
+        # Registering a file waits for a Galaxy job to finish, so all of the files are registered concurrently.
+        self._ingest_files(inputs, ingests)
+
         with self.connection.connect() as connection:
             if inputs:
-                store = connection.create_data_store(name=f"{settings.GALAXY_HISTORY_NAME}_datafile_tools")
+                store = self._get_data_store(connection, f"{settings.GALAXY_HISTORY_NAME}_datafile_tools")
             else:
-                store = connection.create_data_store(name=settings.GALAXY_HISTORY_NAME)
+                store = self._get_data_store(connection, settings.GALAXY_HISTORY_NAME)
 
             tool = Tool(tool_id)
 
@@ -163,7 +554,13 @@ class GalaxyManager:
             for key, value in inputs.items():
                 if value.startswith("file_"):
                     # File will be ingested and contents will be passed to the tool.
-                    id = self.ingest_file(connection, value)
+                    try:
+                        id = ingests[value].result(timeout=max(deadline - monotonic(), 0))
+                    except FutureTimeoutError:
+                        raise TimeoutError(
+                            f"File for parameter '{key}' wasn't registered to Galaxy within "
+                            f"{settings.GALAXY_LAUNCH_TIMEOUT} seconds."
+                        ) from None
                     if id is None:
                         raise ValueError(
                             f"File for parameter '{key}' failed to register to Galaxy. "
@@ -177,89 +574,220 @@ class GalaxyManager:
             if tool_id == "neutrons_remote_command":
                 launch_params.add_input("command_mode|command", "fail")
 
-            tool.run(data_store=store, params=launch_params, wait=False)
+            with track_upstream("galaxy_launch"):
+                tool.run(data_store=store, params=launch_params, wait=False)
+
+                return self._wait_for_uid(tool, deadline)
+
+    def _wait_for_uid(self, tool: Tool, deadline: float) -> str:
+        # nova-galaxy submits the job from its own thread. We poll it with a backoff until Galaxy assigns the job an
+        # ID, and give up if the submission fails or Galaxy doesn't respond in time.
+        delay = LAUNCH_POLL_INITIAL_DELAY
+        while not tool.get_uid():
+            if tool.get_status() == WorkState.ERROR:
+                raise Exception(tool.get_full_status().details.get("message", "Galaxy failed to submit the job."))
+            if monotonic() >= deadline:
+                raise TimeoutError(f"Galaxy didn't accept the job within {settings.GALAXY_LAUNCH_TIMEOUT} seconds.")
+
+            sleep(delay)
+            delay = min(delay * 2, LAUNCH_POLL_MAX_DELAY)
+
+        return tool.get_uid()
+
+    async def monitor_jobs(self, tool_ids: Dict[str, str]) -> list:
+        # Concurrent requests from the same user (e.g. from multiple tabs) share a single scan of Galaxy.
+        jobs = await caching.coalesce(
+            f"galaxy_scan:{self.auth_manager.oauth_state.user_id}",  # type: ignore
+            settings.GALAXY_MONITOR_COALESCE_WINDOW,
+            self._monitor_all_jobs,
+            wait_timeout=settings.GALAXY_MONITOR_DEADLINE * 2,
+        )
+
+        # We only want to show terminal jobs if the dashboard is already aware of them. If the user refreshes the page
+        # after a job failed, then we don't want to display the error anymore.
+        known_job_ids = tool_ids.values()
+        return [job for job in jobs if job["state"] not in TERMINAL_STATES or job["job_id"] in known_job_ids]
+
+    async def _monitor_all_jobs(self) -> list:
+        try:
+            try:
+                return await self._scan_jobs()
+            except Exception as e:
+                if not self._is_missing_history(e):
+                    raise
+
+                # The cached history IDs are stale, so we resolve them again and retry once.
+                await sync_to_async(self._forget_histories)()
+                return await self._scan_jobs()
+        except Exception as e:
+            await sync_to_async(self._handle_galaxy_failure)(e)
 
-            while not tool.get_uid():
-                sleep(0.1)
-            return tool.get_uid()
+        return []
 
-    def monitor_jobs(self, tool_ids: Dict[str, str]) -> list:
+    async def _scan_jobs(self) -> list:
         status_list = []
-        try:
-            with self.connection.connect() as connection:
-                store = connection.create_data_store(name=settings.GALAXY_HISTORY_NAME)
-                datafile_tools_store = connection.create_data_store(
-                    name=f"{settings.GALAXY_HISTORY_NAME}_datafile_tools"
-                )
+        history_id = await self._aget_history_id(settings.GALAXY_HISTORY_NAME)
+        datafile_tools_history_id = await self._aget_history_id(f"{settings.GALAXY_HISTORY_NAME}_datafile_tools")
+
+        jobs, datafile_jobs, last_terminal_jobs = await gather(
+            self._galaxy_get("get_jobs", "/api/jobs", history_id=history_id, state=NONTERMINAL_STATES),
+            self._galaxy_get("get_jobs", "/api/jobs", history_id=datafile_tools_history_id, state=NONTERMINAL_STATES),
+            self._galaxy_get(
+                "get_jobs",
+                "/api/jobs",
+                history_id=history_id,
+                limit=5,  # There are a lot of these, and we are only interested in the most recent ones.
+                order_by="create_time",
+                state=TERMINAL_STATES,
+            ),
+        )
+        # Terminal jobs are filtered per request in monitor_jobs, since the scan is shared between requests.
+        jobs.extend(last_terminal_jobs)
+
+        for job in datafile_jobs:
+            job["is_datafile_tool"] = True
+            jobs.append(job)
+
+        # Probe results are shared between workers. Once a job is ready, it stays ready until its state changes, and
+        # jobs that aren't ready yet are probed again on an exponential backoff rather than on every poll.
+        jobs = [job for job in jobs if job["state"] != "deleted"]
+        cache_keys = [f"galaxy_probe:{job['id']}" for job in jobs]
+        cached_probes = await cache.aget_many(cache_keys)
+        probes = [self._load_probe(job, cached_probes.get(cache_key)) for job, cache_key in zip(jobs, cache_keys)]
+
+        # Each job needs several round trips to Galaxy to check if it is ready, so the jobs are probed concurrently.
+        # Jobs whose probe doesn't finish before the deadline are reported as not ready yet.
+        tasks = [ensure_future(self._probe_job(job, probe)) for job, probe in zip(jobs, probes)]
+        if tasks:
+            await wait(tasks, timeout=settings.GALAXY_MONITOR_DEADLINE)
+
+        changed_probes = {}
+        for job, probe, cache_key, task in zip(jobs, probes, cache_keys, tasks):
+            if task.done():
+                if task.exception() is None:
+                    status_list.append(task.result())
+                # TODO: Might try to handle failed probes better
+            else:
+                task.cancel()
+                self._back_off(probe)
+                status_list.append(self._create_job_status(job, "", False))
 
-                jobs = connection.galaxy_instance.jobs.get_jobs(history_id=store.history_id, state=NONTERMINAL_STATES)
-                datafile_jobs = connection.galaxy_instance.jobs.get_jobs(
-                    history_id=datafile_tools_store.history_id, state=NONTERMINAL_STATES
-                )
-                last_terminal_jobs = connection.galaxy_instance.jobs.get_jobs(
-                    history_id=store.history_id,
-                    limit=5,  # There are a lot of these, and we are only interested in the most recent ones.
-                    order_by="create_time",
-                    state=TERMINAL_STATES,
-                )
-                # We only want to show terminal jobs if the dashboard is already aware of them. If the user refreshes
-                # the page after a job failed, then we don't want to display the error anymore.
-                if last_terminal_jobs:
-                    for _, known_job_id in tool_ids.items():
-                        for job in last_terminal_jobs:
-                            if job["id"] == known_job_id:
-                                jobs.append(job)
-
-                for job in datafile_jobs:
-                    job["is_datafile_tool"] = True
-                    jobs.append(job)
-
-                for job in jobs:
-                    tool = Tool("")
-                    tool.assign_id(new_id=job["id"], data_store=store)
-                    try:
-                        state = job["state"]
-                        url = tool.get_url(max_tries=1)
-                        if url:
-                            response = connection.galaxy_instance.make_get_request(url)
-                            ready = (
-                                response.status_code == 200
-                                and "Proxy target missing"
-                                not in response.text  # Avoid the proxy target missing page appearing
-                                and "Javascript Required for Galaxy"
-                                not in response.text  # Avoid the Galaxy homepage appearing
-                            )
-                        else:
-                            url = ""
-                            ready = False
-
-                        if state != "deleted":
-                            data = {
-                                "is_datafile_tool": job.get("is_datafile_tool", False),
-                                "job_id": job["id"],
-                                "tool_id": job["tool_id"],
-                                "state": state,
-                                "url": url,
-                                "url_ready": ready,
-                            }
-                            if data["is_datafile_tool"]:
-                                parameters = connection.galaxy_instance.jobs.show_job(data["job_id"]).get("params", {})
-                                # Clean up some Galaxy nonsense
-                                for key in ["chromInfo", "dbkey", "__input_ext"]:
-                                    parameters.pop(key, None)
-                                data["parameters"] = parameters
-
-                            status_list.append(data)
-                    except Exception:  # TODO: Might try to handle these better
-                        continue
-        except Exception as e:
-            self._handle_galaxy_failure(e)
+            if probe != cached_probes.get(cache_key):
+                # This includes partial progress from unfinished probes, such as a URL that was found.
+                changed_probes[cache_key] = probe
+
+        if changed_probes:
+            await cache.aset_many(changed_probes, timeout=PROBE_CACHE_TIMEOUT)
 
         return status_list
 
+    def _load_probe(self, job: Dict[str, Any], probe: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if probe is None:
+            return {"state": job["state"], "url": "", "ready": False, "failures": 0, "next_probe": 0.0}
+        if probe["state"] != job["state"]:
+            return {**probe, "state": job["state"], "ready": False, "failures": 0, "next_probe": 0.0}
+
+        return dict(probe)
+
+    async def _probe_job(self, job: Dict[str, Any], probe: Dict[str, Any]) -> Dict[str, Any]:
+        if not probe["ready"] and time() >= probe["next_probe"]:
+            if not probe["url"]:
+                probe["url"] = await self._get_job_url(job)
+
+            probe["ready"] = bool(probe["url"]) and await self._is_url_ready(probe["url"])
+            if not probe["ready"]:
+                self._back_off(probe)
+
+        data = self._create_job_status(job, probe["url"], probe["ready"])
+        if data["is_datafile_tool"]:
+            if "parameters" not in probe:
+                parameters = (await self._galaxy_get("show_job", f"/api/jobs/{data['job_id']}")).get("params", {})
+                # Clean up some Galaxy nonsense
+                for key in ["chromInfo", "dbkey", "__input_ext"]:
+                    parameters.pop(key, None)
+                probe["parameters"] = parameters
+            data["parameters"] = probe["parameters"]
+
+        return data
+
+    def _back_off(self, probe: Dict[str, Any]) -> None:
+        probe["failures"] += 1
+        probe["next_probe"] = time() + min(2 ** probe["failures"], settings.GALAXY_PROBE_MAX_BACKOFF)
+
+    async def _get_job_url(self, job: Dict[str, Any]) -> str:
+        # A failed job will never have an entry point. It is reported with its error state so that the client can
+        # display the failure.
+        if job["state"] == "error":
+            return ""
+
+        try:
+            entry_points = await self._galaxy_get(
+                "entry_points", "/api/entry_points", job_id=job["id"], timeout=settings.GALAXY_PROBE_TIMEOUT
+            )
+        except (HTTPError, JSONDecodeError):
+            # The entry point will be looked up again on the next probe.
+            return ""
+
+        for entry_point in entry_points:
+            if entry_point.get("job_id") == job["id"] and entry_point.get("target"):
+                return f"{self.connection.galaxy_url}{entry_point['target']}"
+
+        return ""
+
+    async def _is_url_ready(self, url: str) -> bool:
+        try:
+            with track_upstream("galaxy_readiness_probe"):
+                async with get_async_client().stream(
+                    "GET", url, headers={"x-api-key": self.connection.api_key}, timeout=settings.GALAXY_PROBE_TIMEOUT
+                ) as response:
+                    if response.status_code != 200:
+                        return False
+
+                    # Galaxy's placeholder pages identify themselves near the top of the page, so we only read the
+                    # beginning of the page rather than downloading all of it.
+                    content = b""
+                    async for chunk in response.aiter_bytes(chunk_size=8192):
+                        content += chunk
+                        if any(sentinel in content for sentinel in PLACEHOLDER_PAGE_SENTINELS):
+                            return False
+                        if len(content) >= settings.GALAXY_PROBE_MAX_BYTES:
+                            break
+
+                    return True
+        except HTTPError:
+            # The tool is likely still starting up.
+            return False
+
+    async def _galaxy_get(self, call: str, path: str, timeout: Optional[float] = None, **params: Any) -> Any:
+        # call names the request in the metrics.
+        with track_upstream(f"galaxy_{call}"):
+            response = await get_async_client().get(
+                f"{self.connection.galaxy_url}{path}",
+                headers={"x-api-key": self.connection.api_key},
+                params=params,
+                timeout=timeout,
+            )
+            response.raise_for_status()
+
+            return response.json()
+
+    def _create_job_status(self, job: Dict[str, Any], url: str, ready: bool) -> Dict[str, Any]:
+        data = {
+            "is_datafile_tool": job.get("is_datafile_tool", False),
+            "job_id": job["id"],
+            "tool_id": job["tool_id"],
+            "state": job["state"],
+            "url": url,
+            "url_ready": ready,
+        }
+        if data["is_datafile_tool"]:
+            data["parameters"] = {}
+
+        return data
+
     def stop_job(self, tool_uid: str) -> None:
         with self.connection.connect() as connection:
-            store = connection.create_data_store(name=settings.GALAXY_HISTORY_NAME)
+            store = self._get_data_store(connection, settings.GALAXY_HISTORY_NAME)
             tool = Tool("")
             tool.assign_id(new_id=tool_uid, data_store=store)
             tool.cancel()
@@ -0,0 +1,34 @@
+"""Defines a command for removing OAuth session states from logins that were never finished."""
+
+from argparse import ArgumentParser
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...pruning import prune_oauth_states
+
+
+class Command(BaseCommand):
+    """Prunes OAuth session states that were never associated with a user."""
+
+    help = "Deletes OAuth session states from logins that were never finished."
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=settings.OAUTH_STATE_MAX_AGE,
+            help="Only delete states older than this many seconds.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.OAUTH_STATE_PRUNE_BATCH_SIZE,
+            help="Number of states to delete in each transaction.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        deleted, duration = prune_oauth_states(options["max_age"], options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} OAuth session states in {duration:.2f}s"))
@@ -0,0 +1,83 @@
+"""Defines Prometheus metrics for the dashboard's views and its requests to upstream services.
+
+Metrics are exposed at /metrics. When PROMETHEUS_MULTIPROC_DIR is set, each server worker writes its metrics to that
+directory and /metrics aggregates the metrics of all workers. The directory must be emptied whenever the server starts.
+
+The time that a request spent waiting on each kind of upstream call is also collected per request, so that it can be
+reported in the request's Server-Timing header.
+"""
+
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+VIEW_LATENCY = Histogram(
+    "nova_dashboard_view_duration_seconds",
+    "Time taken by each view to return a response.",
+    ["view", "method", "status"],
+)
+VIEW_ERRORS = Counter(
+    "nova_dashboard_view_errors_total", "Number of responses with a server error status from each view.", ["view"]
+)
+UPSTREAM_LATENCY = Histogram(
+    "nova_dashboard_upstream_duration_seconds",
+    "Time taken by each kind of request to Galaxy, the OAuth providers or Prometheus.",
+    ["call"],
+)
+UPSTREAM_ERRORS = Counter(
+    "nova_dashboard_upstream_errors_total",
+    "Number of failed requests to Galaxy, the OAuth providers or Prometheus.",
+    ["call"],
+)
+GALAXY_FAILURES = Counter(
+    "nova_dashboard_galaxy_failures_total",
+    "Number of times that a user's Galaxy connection was reset after Galaxy could not be reached.",
+)
+
+# Maps each kind of upstream call to its total duration and count for the current request. The dictionary is mutable so
+# that calls made from threads spawned by sync_to_async and from concurrent tasks are counted too.
+request_timings: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def track_upstream(call: str) -> Iterator[None]:
+    """Records the duration of the enclosed request to an upstream service, and whether it failed."""
+    start = perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(call).inc()
+        raise
+    finally:
+        duration = perf_counter() - start
+        UPSTREAM_LATENCY.labels(call).observe(duration)
+
+        timings = request_timings.get()
+        if timings is not None:
+            timing = timings.setdefault(call, [0.0, 0])
+            timing[0] += duration
+            timing[1] += 1
+
+
+def render_metrics() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+        return generate_latest(registry)
+
+    return generate_latest(REGISTRY)
+
+
+def format_server_timing(timings: Dict[str, List[float]], total: float) -> str:
+    # Concurrent calls of the same kind are summed, so their duration can exceed the total.
+    entries = [
+        f'{call};desc="{int(count)} call(s)";dur={duration * 1000:.1f}' for call, (duration, count) in timings.items()
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+
+    return ", ".join(entries)
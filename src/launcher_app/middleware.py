@@ -0,0 +1,191 @@
+"""Defines middleware for instrumenting requests.
+
+Concurrent writes to the database are a bottleneck with SQLite, so the number of times that a request wrote to the
+OAuth session state is reported in the X-Session-State-Writes response header. The latency of each view is recorded in
+the Prometheus metrics (see metrics.py), and the time spent on upstream calls is reported in the Server-Timing header.
+
+A sample of requests can also be profiled. Requests are picked at random at the PROFILE_SAMPLE_RATE, and profiles of
+requests that took at least PROFILE_MIN_DURATION seconds are saved to PROFILE_DIR. Administrators can profile a single
+request by sending the X-Profile header, in which case the profile is always saved and its name is returned in the
+X-Profile response header. Profiles can be inspected with pstats or a viewer such as snakeviz.
+"""
+
+import os
+from contextvars import ContextVar
+from cProfile import Profile
+from inspect import iscoroutinefunction
+from random import random
+from threading import Lock
+from time import perf_counter, strftime
+from typing import Any, Awaitable, Callable, List, Optional, Union
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import VIEW_ERRORS, VIEW_LATENCY, format_server_timing, request_timings
+from .models import OAuthSessionState
+
+# Holds a mutable counter so that writes made from threads spawned by sync_to_async are counted too.
+state_writes: ContextVar[Optional[List[int]]] = ContextVar("state_writes", default=None)
+
+# Only one profiler can be active in each thread, and concurrent requests in an event loop share a thread, so each
+# worker profiles one request at a time. Requests that are picked while another request is being profiled are skipped.
+_profile_lock = Lock()
+
+
+@receiver(post_save, sender=OAuthSessionState)
+def count_state_write(sender: type, **kwargs: Any) -> None:
+    counter = state_writes.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@sync_and_async_middleware
+def count_state_writes(
+    get_response: Callable[[HttpRequest], Any],
+) -> Callable[[HttpRequest], Union[HttpResponseBase, Awaitable[HttpResponseBase]]]:
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request: HttpRequest) -> HttpResponseBase:
+            counter = [0]
+            state_writes.set(counter)
+            response = await get_response(request)
+            _report_state_writes(response, counter[0])
+
+            return response
+
+        return async_middleware
+
+    def middleware(request: HttpRequest) -> HttpResponseBase:
+        counter = [0]
+        state_writes.set(counter)
+        response = get_response(request)
+        _report_state_writes(response, counter[0])
+
+        return response
+
+    return middleware
+
+
+def _report_state_writes(response: HttpResponseBase, count: int) -> None:
+    if count:
+        response["X-Session-State-Writes"] = str(count)
+
+
+@sync_and_async_middleware
+def track_view_metrics(
+    get_response: Callable[[HttpRequest], Any],
+) -> Callable[[HttpRequest], Union[HttpResponseBase, Awaitable[HttpResponseBase]]]:
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request: HttpRequest) -> HttpResponseBase:
+            start = perf_counter()
+            timings: dict = {}
+            request_timings.set(timings)
+            response = await get_response(request)
+            _record_view_metrics(request, response, timings, perf_counter() - start)
+
+            return response
+
+        return async_middleware
+
+    def middleware(request: HttpRequest) -> HttpResponseBase:
+        start = perf_counter()
+        timings: dict = {}
+        request_timings.set(timings)
+        response = get_response(request)
+        _record_view_metrics(request, response, timings, perf_counter() - start)
+
+        return response
+
+    return middleware
+
+
+def _record_view_metrics(request: HttpRequest, response: HttpResponseBase, timings: dict, duration: float) -> None:
+    # Views are labelled by name rather than by path, since paths can contain IDs. Streaming views are only timed until
+    # they start streaming.
+    match = request.resolver_match
+    view = match.func.__name__ if match is not None else "unresolved"
+
+    VIEW_LATENCY.labels(view, request.method, response.status_code).observe(duration)
+    if response.status_code >= 500:
+        VIEW_ERRORS.labels(view).inc()
+
+    response["Server-Timing"] = format_server_timing(timings, duration)
+
+
+@sync_and_async_middleware
+def profile_requests(
+    get_response: Callable[[HttpRequest], Any],
+) -> Callable[[HttpRequest], Union[HttpResponseBase, Awaitable[HttpResponseBase]]]:
+    # For asynchronous views, the profile also includes other requests that the event loop served in the meantime.
+    # Synchronous code that a request runs through sync_to_async isn't included.
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request: HttpRequest) -> HttpResponseBase:
+            requested = "X-Profile" in request.headers and _is_admin(await request.auser())
+            if not (requested or random() < settings.PROFILE_SAMPLE_RATE) or not _profile_lock.acquire(blocking=False):
+                return await get_response(request)
+
+            try:
+                profile = Profile()
+                start = perf_counter()
+                profile.enable()
+                try:
+                    response = await get_response(request)
+                finally:
+                    profile.disable()
+                _save_profile(request, response, profile, perf_counter() - start, requested)
+            finally:
+                _profile_lock.release()
+
+            return response
+
+        return async_middleware
+
+    def middleware(request: HttpRequest) -> HttpResponseBase:
+        requested = "X-Profile" in request.headers and _is_admin(request.user)
+        if not (requested or random() < settings.PROFILE_SAMPLE_RATE) or not _profile_lock.acquire(blocking=False):
+            return get_response(request)
+
+        try:
+            profile = Profile()
+            start = perf_counter()
+            profile.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profile.disable()
+            _save_profile(request, response, profile, perf_counter() - start, requested)
+        finally:
+            _profile_lock.release()
+
+        return response
+
+    return middleware
+
+
+def _is_admin(user: Union[AbstractBaseUser, AnonymousUser]) -> bool:
+    return user.is_authenticated and user.get_username() in settings.NOVA_ADMINS
+
+
+def _save_profile(
+    request: HttpRequest, response: HttpResponseBase, profile: Profile, duration: float, requested: bool
+) -> None:
+    if not requested and duration < settings.PROFILE_MIN_DURATION:
+        return
+
+    match = request.resolver_match
+    view = match.func.__name__ if match is not None else "unresolved"
+    name = f"{strftime('%Y%m%d-%H%M%S')}-{view}-{duration * 1000:.0f}ms-{uuid4().hex[:8]}.prof"
+
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profile.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+    if requested:
+        response["X-Profile"] = name
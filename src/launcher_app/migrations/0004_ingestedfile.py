@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('launcher_app', '0003_galaxyhistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('dataset_id', models.CharField(max_length=64)),
+                ('last_used', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'path'), name='unique_user_ingested_path')],
+            },
+        ),
+    ]
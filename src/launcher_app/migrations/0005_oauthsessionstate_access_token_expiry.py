@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('launcher_app', '0004_ingestedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='oauthsessionstate',
+            name='access_token_expiry',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('launcher_app', '0005_oauthsessionstate_access_token_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='oauthsessionstate',
+            name='create_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='oauthsessionstate',
+            name='state_param',
+            field=models.CharField(blank=True, db_index=True, max_length=128),
+        ),
+    ]
@@ -5,8 +5,13 @@ in memory. Doing so in memory makes the server stateful and makes it difficult
 to run multiple server workers.
 """
 
+from typing import Any
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 
 class Notification(models.Model):
@@ -15,6 +20,8 @@ class Notification(models.Model):
     display: models.BooleanField = models.BooleanField(blank=True, default=False)
     message: models.CharField = models.CharField(max_length=255, blank=True)
 
+    CACHE_KEY = "notification"
+
 
 class OAuthSessionState(models.Model):
     """Keeps track of OAuth session state.
@@ -27,9 +34,67 @@ class OAuthSessionState(models.Model):
 
     user = models.OneToOneField(get_user_model(), blank=True, null=True, on_delete=models.CASCADE)  # type: ignore
     access_token = models.CharField(max_length=255, blank=True)  # type: ignore
-    create_time = models.DateTimeField(auto_now_add=True)  # type: ignore
+    access_token_expiry = models.DateTimeField(blank=True, null=True)  # type: ignore
+    # Indexed for pruning states from logins that were never finished
+    create_time = models.DateTimeField(auto_now_add=True, db_index=True)  # type: ignore
     galaxy_api_key = models.CharField(max_length=128, blank=True)  # type: ignore
     refresh_token = models.CharField(max_length=255, blank=True)  # type: ignore
     # ucams or xcams
     session_type = models.CharField(max_length=32, blank=True)  # type: ignore
-    state_param = models.CharField(max_length=128, blank=True)  # type: ignore
+    # Indexed for looking up the state when the OAuth provider redirects back to us
+    state_param = models.CharField(max_length=128, blank=True, db_index=True)  # type: ignore
+
+    @staticmethod
+    def get_cache_key(user_id: int) -> str:
+        return f"oauth_state:{user_id}"
+
+
+class GalaxyHistory(models.Model):
+    """Caches the ID of a Galaxy history used by the dashboard.
+
+    History IDs never change once a history has been created, so this lets us
+    avoid looking up each history by name on every request to Galaxy.
+    """
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)  # type: ignore
+    name = models.CharField(max_length=255)  # type: ignore
+    history_id = models.CharField(max_length=64)  # type: ignore
+
+    class Meta:
+        """Each user has at most one history with a given name."""
+
+        constraints = [models.UniqueConstraint(fields=["user", "name"], name="unique_user_history_name")]
+
+
+class IngestedFile(models.Model):
+    """Remembers the Galaxy dataset that a data file was registered as.
+
+    Registering a file runs a Galaxy job, so launches that reference an
+    unchanged file reuse the dataset from the last time it was registered.
+    """
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)  # type: ignore
+    path = models.CharField(max_length=1024)  # type: ignore
+    size = models.BigIntegerField()  # type: ignore
+    mtime_ns = models.BigIntegerField()  # type: ignore
+    dataset_id = models.CharField(max_length=64)  # type: ignore
+    last_used = models.DateTimeField(auto_now=True)  # type: ignore
+
+    class Meta:
+        """Each user has at most one dataset for a given file."""
+
+        constraints = [models.UniqueConstraint(fields=["user", "path"], name="unique_user_ingested_path")]
+
+
+@receiver([post_save, post_delete], sender=OAuthSessionState)
+def invalidate_cached_oauth_state(sender: type, instance: OAuthSessionState, **kwargs: Any) -> None:
+    if instance.user_id is not None:  # type: ignore
+        cache.delete(OAuthSessionState.get_cache_key(instance.user_id))  # type: ignore
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def refresh_cached_notification(sender: type, instance: Notification, **kwargs: Any) -> None:
+    # Imported here because the notification module depends on the models.
+    from .notification import NotificationManager
+
+    NotificationManager().refresh_cache()
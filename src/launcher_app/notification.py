@@ -1,19 +1,36 @@
 """Defines a class for interacting with system notifications."""
 
-from typing import Any, Dict
+import json
+from hashlib import sha256
+from typing import Any, Dict, Tuple
+
+from django.core.cache import cache
 
 from .models import Notification
 
+# Bounds how long a stale entry can be served if two writers race, e.g. two notifications saved at the same time.
+CACHE_TIMEOUT = 300
+
 
 class NotificationManager:
     """Class to manage system notifications."""
 
     def get(self) -> Dict[str, Any]:
-        notification = Notification.objects.first()
-        if notification:
-            return {"display": notification.display, "message": notification.message}
+        return self.get_versioned()[1]
 
-        return {}
+    def get_versioned(self) -> Tuple[str, Dict[str, Any]]:
+        # Every client polls the notification, but it rarely changes. Saving it writes the new entry to the cache (see
+        # models.py), so a missing entry is only added here. Otherwise a request that read the notification before it
+        # was saved could replace the new entry with the old one.
+        entry = cache.get(Notification.CACHE_KEY)
+        if entry is None:
+            entry = self._build_entry()
+            cache.add(Notification.CACHE_KEY, entry, timeout=CACHE_TIMEOUT)
+
+        return entry["version"], entry["data"]
+
+    def refresh_cache(self) -> None:
+        cache.set(Notification.CACHE_KEY, self._build_entry(), timeout=CACHE_TIMEOUT)
 
     def set(self, data: Dict[str, Any]) -> None:
         notification = Notification.objects.first()
@@ -26,3 +43,16 @@ class NotificationManager:
             notification.message = data["message"]
 
         notification.save()
+
+    def _build_entry(self) -> Dict[str, Any]:
+        data = self._load()
+        # The version only depends on the notification, so it is the same in every worker.
+        version = sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:32]
+        return {"version": version, "data": data}
+
+    def _load(self) -> Dict[str, Any]:
+        notification = Notification.objects.first()
+        if notification:
+            return {"display": notification.display, "message": notification.message}
+
+        return {}
@@ -0,0 +1,112 @@
+"""Defines a worker-level pool of Galaxy connections.
+
+Opening a Galaxy connection requires several round trips (resolving the Galaxy URL and checking the Galaxy version), so
+connections are kept open and reused for repeated requests from the same user. The pool is keyed by the user's Galaxy
+API key and can be controlled via the GALAXY_CONNECTION_POOL_SIZE and GALAXY_CONNECTION_IDLE_TIMEOUT settings.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from typing import Iterator
+
+from django.conf import settings
+from nova.galaxy import Connection
+from nova.galaxy.connection import ConnectionHelper
+
+
+class PooledConnection:
+    """An initialised Galaxy connection for a single API key."""
+
+    def __init__(self, api_key: str):
+        """Init."""
+        self.api_key = api_key
+        self.last_used = monotonic()
+
+        self.galaxy_connection = Connection(settings.GALAXY_URL, api_key)
+        self.helper = self.galaxy_connection.connect()
+        # Maps history names to IDs so that histories only need to be resolved once per connection. It is filled on
+        # first use by GalaxyManager, which looks up the IDs stored for the user before asking Galaxy.
+        self.history_ids: dict[str, str] = {}
+
+    @property
+    def galaxy_url(self) -> str:
+        # The URL after following any redirects from GALAXY_URL.
+        return self.helper.galaxy_url
+
+    @contextmanager
+    def connect(self) -> Iterator[ConnectionHelper]:
+        try:
+            yield self.helper
+        finally:
+            # The helper tracks every data store that is opened through it, so this prevents it from growing for as
+            # long as the connection is pooled.
+            self.helper.datastores.clear()
+
+    def close(self) -> None:
+        try:
+            self.helper.close()
+        except ValueError:
+            # The helper was already closed.
+            pass
+
+
+class ConnectionPool:
+    """Least-recently-used pool of Galaxy connections with idle eviction."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self._connections: OrderedDict[str, PooledConnection] = OrderedDict()
+        self._lock = Lock()
+
+    def acquire(self, api_key: str) -> PooledConnection:
+        with self._lock:
+            self._evict_idle()
+            connection = self._connections.get(api_key)
+            if connection is not None:
+                connection.last_used = monotonic()
+                self._connections.move_to_end(api_key)
+                return connection
+
+        # Connecting requires requests to Galaxy, so we don't hold the lock while doing so.
+        new_connection = PooledConnection(api_key)
+
+        with self._lock:
+            connection = self._connections.get(api_key)
+            if connection is None:
+                connection = new_connection
+                self._connections[api_key] = connection
+            self._connections.move_to_end(api_key)
+            evicted = self._evict_oldest()
+
+        if connection is not new_connection:
+            # Another request connected with the same key while we were connecting.
+            evicted.append(new_connection)
+        for stale_connection in evicted:
+            stale_connection.close()
+
+        return connection
+
+    def discard(self, api_key: str) -> None:
+        with self._lock:
+            connection = self._connections.pop(api_key, None)
+
+        if connection is not None:
+            connection.close()
+
+    def _evict_idle(self) -> None:
+        cutoff = monotonic() - settings.GALAXY_CONNECTION_IDLE_TIMEOUT
+        for api_key in list(self._connections.keys()):
+            if self._connections[api_key].last_used < cutoff:
+                self._connections.pop(api_key).close()
+
+    def _evict_oldest(self) -> list[PooledConnection]:
+        evicted = []
+        while len(self._connections) > settings.GALAXY_CONNECTION_POOL_SIZE:
+            evicted.append(self._connections.popitem(last=False)[1])
+
+        return evicted
+
+
+connection_pool = ConnectionPool()
@@ -0,0 +1,71 @@
+"""Removes OAuth session states from logins that were never finished.
+
+A state is stored whenever a user starts logging in, but it is only associated with the user once they finish. States
+older than OAUTH_STATE_MAX_AGE seconds that were never associated with a user can be pruned with the prune_oauth_states
+management command, or periodically by each server if OAUTH_STATE_PRUNE_INTERVAL is set.
+"""
+
+import logging
+from datetime import timedelta
+from threading import Thread
+from time import monotonic, sleep
+from typing import Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+from .caching import acquire
+from .models import OAuthSessionState
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def prune_oauth_states(max_age: int, batch_size: int) -> Tuple[int, float]:
+    """Deletes unfinished session states older than max_age seconds, batch_size rows at a time.
+
+    Returns the number of states that were deleted and the number of seconds it took.
+    """
+    start = monotonic()
+    cutoff = now() - timedelta(seconds=max_age)
+    stale_states = OAuthSessionState.objects.filter(user__isnull=True, create_time__lt=cutoff)
+
+    # Deleting in small batches keeps each transaction short, so logins aren't blocked while a large backlog is pruned.
+    deleted = 0
+    while True:
+        batch = list(stale_states.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            break
+
+        # A login can finish between selecting the batch and deleting it, so the batch is deleted with a single DELETE
+        # statement that checks the conditions again. QuerySet.delete() would select the rows first and then delete them
+        # by primary key. Skipping the delete signals is safe because the states don't belong to a user yet (see
+        # invalidate_cached_oauth_state), and no other models refer to them.
+        deleted += stale_states.filter(pk__in=batch)._raw_delete(stale_states.db)
+
+    return deleted, monotonic() - start
+
+
+def start_pruning() -> None:
+    """Prunes session states in the background every OAUTH_STATE_PRUNE_INTERVAL seconds."""
+    if settings.OAUTH_STATE_PRUNE_INTERVAL > 0:
+        Thread(target=_prune_periodically, daemon=True).start()
+
+
+def _prune_periodically() -> None:
+    interval = settings.OAUTH_STATE_PRUNE_INTERVAL
+    while True:
+        sleep(interval)
+
+        # Only one worker on each host needs to prune during each interval.
+        if not acquire("oauth_state_pruning", interval):
+            continue
+
+        try:
+            deleted, duration = prune_oauth_states(settings.OAUTH_STATE_MAX_AGE, settings.OAUTH_STATE_PRUNE_BATCH_SIZE)
+            logger.info(f"Pruned {deleted} OAuth session states in {duration:.2f}s")
+        except Exception as e:
+            logger.error(f"Failed to prune OAuth session states: {e}")
+        finally:
+            close_old_connections()
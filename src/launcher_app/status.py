@@ -1,25 +1,68 @@
-"""Manages fetching and processing system status data."""
+"""Manages fetching and processing system status data.
 
+The processed alert and target lists are the same for every user, so they are cached for all clients for
+STATUS_CACHE_TTL seconds.
+"""
+
+from asyncio import gather
 from typing import Any, Dict, List
 
-import requests
 from django.conf import settings
+from django.core.cache import cache
 
+from .clients import get_async_client
+from .metrics import track_upstream
 
-class StatusManager:
-    """Manages fetching and processing system status data."""
-
-    def get_alerts(self) -> List[Dict[str, Any]]:
-        response = requests.get(settings.ALERTS_URL, verify=False)
-        raw_data = response.json()
+STATUS_CACHE_KEYS = {"alerts": "status_alerts", "targets": "status_targets"}
 
-        return self.process_alerts(raw_data)
 
-    def get_targets(self) -> List[Dict[str, Any]]:
-        response = requests.get(settings.TARGETS_URL, verify=False)
-        raw_data = response.json()
+class StatusManager:
+    """Manages fetching and processing system status data."""
 
-        return self.process_targets(raw_data)
+    async def get_alerts(self) -> List[Dict[str, Any]]:
+        return await self.get_cached("alerts")
+
+    async def get_targets(self) -> List[Dict[str, Any]]:
+        return await self.get_cached("targets")
+
+    async def get_cached(self, kind: str) -> List[Dict[str, Any]]:
+        cached = await cache.aget_many(STATUS_CACHE_KEYS.values())
+        if STATUS_CACHE_KEYS[kind] in cached:
+            return cached[STATUS_CACHE_KEYS[kind]]
+
+        # Clients request both lists when they load, so any other expired list is fetched alongside this one.
+        stale_kinds = [stale_kind for stale_kind, key in STATUS_CACHE_KEYS.items() if key not in cached]
+        results = await gather(*[self.fetch(stale_kind) for stale_kind in stale_kinds], return_exceptions=True)
+
+        fetched = dict(zip(stale_kinds, results))
+        await cache.aset_many(
+            {
+                STATUS_CACHE_KEYS[fetched_kind]: result
+                for fetched_kind, result in fetched.items()
+                if not isinstance(result, BaseException)
+            },
+            timeout=settings.STATUS_CACHE_TTL,
+        )
+
+        result = fetched[kind]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    async def fetch(self, kind: str) -> List[Dict[str, Any]]:
+        with track_upstream(f"prometheus_{kind}"):
+            return await self._fetch(kind)
+
+    async def _fetch(self, kind: str) -> List[Dict[str, Any]]:
+        match kind:
+            case "alerts":
+                response = await get_async_client(verify=False).get(settings.ALERTS_URL)
+                return self.process_alerts(response.json())
+            case "targets":
+                response = await get_async_client(verify=False).get(settings.TARGETS_URL)
+                return self.process_targets(response.json())
+            case _:
+                raise ValueError(f"Unknown status kind '{kind}'.")
 
     def process_alerts(self, raw_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         format = settings.ALERTS_FORMAT
@@ -0,0 +1,107 @@
+"""Defines a server-sent events stream of a user's Galaxy jobs.
+
+Rather than having each client poll the monitor endpoint, the stream scans Galaxy on the server and only sends the job
+list to the client when it changes. Scans happen every GALAXY_STREAM_MIN_INTERVAL seconds while jobs are changing and
+back off to GALAXY_STREAM_MAX_INTERVAL seconds while they are settled. The client reopens the stream whenever the set
+of jobs it knows about changes.
+
+The stream ends when the user's session is no longer valid (e.g. they logged out) and after GALAXY_STREAM_MAX_LIFETIME
+seconds. The client then reconnects, which authenticates the request again.
+"""
+
+import json
+from asyncio import sleep as async_sleep
+from importlib import import_module
+from time import monotonic, sleep
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http import HttpRequest
+
+from .galaxy import create_galaxy_manager, get_galaxy_error_message
+
+# Sent to keep proxies from closing the connection while the job list isn't changing.
+HEARTBEAT = ": heartbeat\n\n"
+
+
+class JobStream:
+    """Scans a user's Galaxy jobs on an adaptive schedule and formats changes as server-sent events."""
+
+    def __init__(self, request: HttpRequest, tool_ids: Dict[str, str]):
+        """Init."""
+        self.request = request
+        self.tool_ids = tool_ids
+        self.interval = settings.GALAXY_STREAM_MIN_INTERVAL
+        self.last_event = ""
+        self.last_sent = monotonic()
+        self.deadline = monotonic() + settings.GALAXY_STREAM_MAX_LIFETIME
+
+    def __iter__(self) -> Iterator[str]:
+        """Serves the stream from a synchronous server (e.g. the development server)."""
+        while True:
+            event, delay = async_to_sync(self.step)()
+            if event:
+                yield event
+            if delay is None:
+                return
+            sleep(delay)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        """Serves the stream from an asynchronous server without holding a thread between scans."""
+        while True:
+            event, delay = await self.step()
+            if event:
+                yield event
+            if delay is None:
+                return
+            await async_sleep(delay)
+
+    async def step(self) -> Tuple[Optional[str], Optional[float]]:
+        """Scans Galaxy once and returns the event to send (if any) and the delay until the next scan.
+
+        The delay is None when the stream should end.
+        """
+        if monotonic() >= self.deadline or not await sync_to_async(self._has_valid_session)():
+            return None, None
+
+        try:
+            galaxy_manager = await sync_to_async(create_galaxy_manager)(self.request)
+            jobs = await galaxy_manager.monitor_jobs(self.tool_ids)
+        except Exception as e:
+            # Forces the next successful scan to be sent so that the client clears the error.
+            self.last_event = ""
+            self.interval = settings.GALAXY_STREAM_MIN_INTERVAL
+
+            error = json.dumps({"error": get_galaxy_error_message(e)})
+
+            return self._send(f"event: galaxy_error\ndata: {error}\n\n"), self.interval
+
+        event = f"data: {json.dumps({'jobs': jobs})}\n\n"
+        settled = all(job["state"] == "running" and job["url_ready"] for job in jobs)
+        if event != self.last_event:
+            self.last_event = event
+            self.interval = settings.GALAXY_STREAM_MIN_INTERVAL
+
+            return self._send(event), self.interval
+
+        if settled:
+            self.interval = min(self.interval * 2, settings.GALAXY_STREAM_MAX_INTERVAL)
+        if monotonic() - self.last_sent >= settings.GALAXY_STREAM_HEARTBEAT_INTERVAL:
+            return self._send(HEARTBEAT), self.interval
+
+        return None, self.interval
+
+    def _has_valid_session(self) -> bool:
+        # The request's session was loaded when the stream was opened, so it is loaded again to notice the user logging
+        # out or their session expiring.
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(self.request.session.session_key)
+
+        return get_user(request).pk == self.request.user.pk
+
+    def _send(self, event: str) -> str:
+        self.last_sent = monotonic()
+
+        return event
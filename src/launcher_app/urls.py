@@ -28,12 +28,19 @@ urlpatterns = [
     path("api/status/alerts/", views.get_alerts),
     path("api/status/targets/", views.get_targets),
     path("api/auth/user/", views.get_user),
+    path("api/auth/login/ucams/", views.ucams_login, name="ucams_login"),
+    path("api/auth/login/xcams/", views.xcams_login, name="xcams_login"),
     path("api/galaxy/user_status/", views.galaxy_user_status),
     path("api/galaxy/launch/", views.galaxy_launch),
+    path("api/galaxy/launch/batch/", views.galaxy_launch_batch),
+    path("api/galaxy/launch/<str:ticket_id>/", views.galaxy_launch_status),
     path("api/galaxy/monitor/", views.galaxy_monitor),
+    path("api/galaxy/monitor/stream/", views.galaxy_monitor_stream),
     path("api/galaxy/stop/", views.galaxy_stop),
     path("api/galaxy/tools/", views.galaxy_tools),
+    path("api/galaxy/tools/refresh/", views.galaxy_tools_refresh),
     path("api/notification/", views.notification),
+    path("metrics", views.metrics),
     path(settings.UCAMS_REDIRECT_PATH, views.ucams_redirect, name="ucams_redirect"),
     path(settings.XCAMS_REDIRECT_PATH, views.xcams_redirect, name="xcams_redirect"),
 ]
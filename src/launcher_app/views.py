@@ -7,12 +7,14 @@ specified in urls.py file.
 import json
 import urllib.parse
 from importlib.resources import open_text
-from typing import Any
+from typing import Any, Dict, List, Optional, Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import logout
 from django.contrib.auth.models import AbstractBaseUser
 from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
 from django.http import (
     HttpRequest,
     HttpResponse,
@@ -21,16 +23,30 @@ from django.http import (
     JsonResponse,
     StreamingHttpResponse,
 )
+from django.http.response import HttpResponseBase
 from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_GET, require_http_methods, require_POST
-from requests import ConnectionError
+from prometheus_client import CONTENT_TYPE_LATEST
 from requests import request as proxy_request
 
 from .auth import AuthManager
-from .galaxy import GalaxyManager
+from .galaxy import (
+    GalaxyManager,
+    create_galaxy_manager,
+    get_galaxy_error_message,
+    get_launch_ticket,
+    get_launch_tickets,
+)
+from .metrics import render_metrics
 from .notification import NotificationManager
+from .pool import connection_pool
 from .status import StatusManager
+from .stream import JobStream
 
 
 def is_admin(user: AbstractBaseUser) -> bool:
@@ -50,6 +66,22 @@ def get_vuetify_config(request: HttpRequest) -> JsonResponse:
         return JsonResponse(json.load(vuetify_config))
 
 
+@require_GET
+def ucams_login(request: HttpRequest) -> HttpResponseRedirect:
+    auth_manager = AuthManager(request)
+    auth_manager.start_login()
+
+    return redirect(_get_ucams_login_url(auth_manager))
+
+
+@require_GET
+def xcams_login(request: HttpRequest) -> HttpResponseRedirect:
+    auth_manager = AuthManager(request)
+    auth_manager.start_login()
+
+    return redirect(_get_xcams_login_url(auth_manager))
+
+
 @require_GET
 def ucams_redirect(request: HttpRequest) -> HttpResponseRedirect:
     auth_manager = AuthManager(request)
@@ -77,22 +109,23 @@ def xcams_redirect(request: HttpRequest) -> HttpResponseRedirect:
 
 
 @require_GET
-def get_alerts(request: HttpRequest) -> JsonResponse:
+async def get_alerts(request: HttpRequest) -> JsonResponse:
     status_manager = StatusManager()
+    user = await request.auser()
 
     alert_data = {
-        "alerts": status_manager.get_alerts(),
-        "url": settings.MONITORING_URL if request.user.is_authenticated and is_admin(request.user) else "",
+        "alerts": await status_manager.get_alerts(),
+        "url": settings.MONITORING_URL if user.is_authenticated and is_admin(user) else "",
     }
 
     return JsonResponse(alert_data)
 
 
 @require_GET
-def get_targets(request: HttpRequest) -> JsonResponse:
+async def get_targets(request: HttpRequest) -> JsonResponse:
     status_manager = StatusManager()
 
-    return JsonResponse(status_manager.get_targets(), safe=False)
+    return JsonResponse(await status_manager.get_targets(), safe=False)
 
 
 @ensure_csrf_cookie
@@ -101,8 +134,6 @@ def get_user(request: HttpRequest) -> JsonResponse:
     # This is the first request that the client makes to our API,
     # so we need to set the CSRF cookie here before any POST requests
     # are made.
-    auth_manager = AuthManager(request)
-
     given_name = None
     admin = False
     if request.user.is_authenticated:
@@ -114,8 +145,9 @@ def get_user(request: HttpRequest) -> JsonResponse:
             "given_name": given_name,
             "is_admin": admin,
             "is_logged_in": given_name is not None,
-            "ucams": _get_ucams_login_url(auth_manager),
-            "xcams": _get_xcams_login_url(auth_manager),
+            # The login URLs are generated when a login starts, so that this request doesn't need a session state.
+            "ucams": reverse("ucams_login"),
+            "xcams": reverse("xcams_login"),
         }
     )
 
@@ -131,13 +163,7 @@ def _get_xcams_login_url(auth_manager: AuthManager) -> str:
 
 
 def _create_galaxy_error(exception: Exception, **kwargs: Any) -> JsonResponse:
-    message = str(exception)
-    if isinstance(exception, json.JSONDecodeError):
-        message = f"Unable to fetch tool list, {settings.GALAXY_URL} may be restarting."
-    if isinstance(exception, ConnectionError) or "502 Bad Gateway" in message:
-        message = f"Unable to connect to Galaxy, {settings.GALAXY_URL} may be restarting."
-
-    return JsonResponse({"error": message, **kwargs}, status=500)
+    return JsonResponse({"error": get_galaxy_error_message(exception), **kwargs}, status=500)
 
 
 def _create_galaxy_status_error(exception: Exception, auth_type: str, status_code: int) -> JsonResponse:
@@ -156,24 +182,115 @@ def galaxy_launch(request: HttpRequest) -> HttpResponse:
         galaxy_manager = GalaxyManager(auth_manager)
 
         data = json.loads(request.body)
-        job_id = galaxy_manager.launch_job(data.get("tool_id", None), data.get("inputs", {}))
+        ticket_id = galaxy_manager.submit_launch(data.get("tool_id", None), data.get("inputs", {}))
 
-        return JsonResponse({"id": job_id})
+        # The job is submitted in the background. The client polls galaxy_launch_status for the job ID.
+        return JsonResponse({"ticket": ticket_id}, status=202)
     except Exception as e:
         return _create_galaxy_error(e)
 
 
 @require_GET
-def galaxy_user_status(request: HttpRequest) -> JsonResponse:
-    if not request.user.is_authenticated:
+async def galaxy_launch_status(request: HttpRequest, ticket_id: str) -> JsonResponse:
+    user = await request.auser()
+    if not user.is_authenticated:
+        raise PermissionDenied()
+
+    ticket = await get_launch_ticket(ticket_id, user.pk)
+    if ticket is None:
+        return JsonResponse({"error": "Launch ticket not found."}, status=404)
+
+    match ticket["state"]:
+        case "pending":
+            return JsonResponse({"ticket": ticket_id}, status=202)
+        case "failed":
+            return JsonResponse({"error": ticket["error"]}, status=500)
+        case _:
+            return JsonResponse({"id": ticket["job_id"]})
+
+
+@require_http_methods(["GET", "POST"])
+async def galaxy_launch_batch(request: HttpRequest) -> JsonResponse:
+    user = await request.auser()
+    if not user.is_authenticated:
+        raise PermissionDenied()
+
+    max_size = settings.GALAXY_LAUNCH_BATCH_MAX_SIZE
+    if request.method == "GET":
+        ticket_ids = [ticket_id for ticket_id in request.GET.get("tickets", "").split(",") if ticket_id]
+        if len(ticket_ids) > max_size:
+            return JsonResponse({"error": f"At most {max_size} launch tickets can be checked at once."}, status=400)
+        tickets = await get_launch_tickets(ticket_ids, user.pk)
+
+        return JsonResponse({"launches": [_describe_launch(ticket_id, tickets[ticket_id]) for ticket_id in ticket_ids]})
+
+    launches = _parse_launches(request.body)
+    if launches is None:
+        return JsonResponse(
+            {"error": "Expected a list of launches, each with a tool_id and optional string inputs."}, status=400
+        )
+    if len(launches) > max_size:
+        return JsonResponse({"error": f"At most {max_size} jobs can be launched at once."}, status=400)
+
+    try:
+        galaxy_manager = await sync_to_async(create_galaxy_manager)(request)
+        ticket_ids = await sync_to_async(galaxy_manager.submit_launches)(launches)
+
+        # Each launch is submitted in the background. The client polls this view with the tickets for the job IDs.
+        return JsonResponse({"tickets": ticket_ids}, status=202)
+    except Exception as e:
+        return _create_galaxy_error(e)
+
+
+def _parse_launches(body: bytes) -> Optional[List[Tuple[str, Dict[str, str]]]]:
+    try:
+        launches = json.loads(body)["launches"]
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(launches, list):
+        return None
+
+    parsed = []
+    for launch in launches:
+        if not isinstance(launch, dict) or not isinstance(launch.get("tool_id"), str):
+            return None
+        inputs = launch.get("inputs", {})
+        if not isinstance(inputs, dict) or not all(isinstance(value, str) for value in inputs.values()):
+            return None
+        parsed.append((launch["tool_id"], inputs))
+
+    return parsed
+
+
+def _describe_launch(ticket_id: str, ticket: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if ticket is None:
+        return {"ticket": ticket_id, "state": "failed", "error": "Launch ticket not found."}
+
+    match ticket["state"]:
+        case "pending":
+            return {"ticket": ticket_id, "state": "pending"}
+        case "failed":
+            return {"ticket": ticket_id, "state": "failed", "error": ticket["error"]}
+        case _:
+            return {"ticket": ticket_id, "state": "submitted", "id": ticket["job_id"]}
+
+
+@require_GET
+async def galaxy_user_status(request: HttpRequest) -> JsonResponse:
+    if not (await request.auser()).is_authenticated:
         raise PermissionDenied()
 
     session_type = ""
     try:
-        auth_manager = AuthManager(request)
-        auth_manager.delete_galaxy_api_key()  # Forces Galaxy to verify refresh token
+        auth_manager = await sync_to_async(AuthManager)(request)
         session_type = auth_manager.oauth_state.session_type
-        GalaxyManager(auth_manager)
+
+        # Refreshing the user's tokens and requesting a new API key takes several round trips, so we only do so once
+        # Galaxy rejects the key that we already have.
+        if not await auth_manager.verify_galaxy_api_key():
+            connection_pool.discard(auth_manager.oauth_state.galaxy_api_key)
+            await sync_to_async(auth_manager.delete_galaxy_api_key)()  # Forces Galaxy to verify refresh token
+            await sync_to_async(GalaxyManager)(auth_manager)
 
         return JsonResponse({"status": "ok"})
     except Exception as e:
@@ -185,20 +302,40 @@ def galaxy_user_status(request: HttpRequest) -> JsonResponse:
 
 
 @require_POST
-def galaxy_monitor(request: HttpRequest) -> JsonResponse:
-    if not request.user.is_authenticated:
+async def galaxy_monitor(request: HttpRequest) -> JsonResponse:
+    if not (await request.auser()).is_authenticated:
         raise PermissionDenied()
 
     try:
-        auth_manager = AuthManager(request)
-        galaxy_manager = GalaxyManager(auth_manager)
+        galaxy_manager = await sync_to_async(create_galaxy_manager)(request)
         data = json.loads(request.body)
 
-        return JsonResponse({"jobs": galaxy_manager.monitor_jobs(data["tool_ids"])})
+        return JsonResponse({"jobs": await galaxy_manager.monitor_jobs(data["tool_ids"])})
     except Exception as e:
         return _create_galaxy_error(e)
 
 
+@require_GET
+def galaxy_monitor_stream(request: HttpRequest) -> HttpResponseBase:
+    if not request.user.is_authenticated:
+        raise PermissionDenied()
+
+    try:
+        tool_ids = json.loads(request.GET.get("tool_ids", "{}"))
+    except json.JSONDecodeError:
+        return HttpResponseBadRequest("tool_ids parameter is malformed")
+
+    # Asynchronous servers can hold the stream open without tying up a thread.
+    stream = JobStream(request, tool_ids)
+    response = StreamingHttpResponse(
+        stream.__aiter__() if isinstance(request, ASGIRequest) else iter(stream), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Prevents nginx from buffering events
+
+    return response
+
+
 @require_POST
 def galaxy_stop(request: HttpRequest) -> HttpResponse:
     if not request.user.is_authenticated:
@@ -217,11 +354,26 @@ def galaxy_stop(request: HttpRequest) -> HttpResponse:
 
 
 @require_GET
-def galaxy_tools(request: HttpRequest) -> JsonResponse:
+async def galaxy_tools(request: HttpRequest) -> JsonResponse:
+    try:
+        galaxy_manager = GalaxyManager()
+
+        return JsonResponse({"tools": await galaxy_manager.get_tools()})
+    except Exception as e:
+        return _create_galaxy_error(e, tools={})
+
+
+@require_POST
+async def galaxy_tools_refresh(request: HttpRequest) -> JsonResponse:
+    # Allows admins to make newly deployed tools visible without waiting for the cached tool list to expire.
+    user = await request.auser()
+    if not user.is_authenticated or not is_admin(user):
+        raise PermissionDenied
+
     try:
         galaxy_manager = GalaxyManager()
 
-        return JsonResponse({"tools": galaxy_manager.get_tools()})
+        return JsonResponse({"tools": await galaxy_manager.refresh_tools()})
     except Exception as e:
         return _create_galaxy_error(e, tools={})
 
@@ -231,7 +383,14 @@ def notification(request: HttpRequest) -> HttpResponse:
     notification_manager = NotificationManager()
 
     if request.method == "GET":
-        return JsonResponse(notification_manager.get())
+        # Clients send the version they already have, so that unchanged notifications don't need to be sent again.
+        version, data = notification_manager.get_versioned()
+        etag = quote_etag(version)
+        response = get_conditional_response(request, etag=etag) or JsonResponse(data)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+
+        return response
 
     if not request.user.is_authenticated or not is_admin(request.user):
         raise PermissionDenied
@@ -245,6 +404,16 @@ def notification(request: HttpRequest) -> HttpResponse:
     return HttpResponse()
 
 
+@require_GET
+def metrics(request: HttpRequest) -> HttpResponse:
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise PermissionDenied
+
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
 @require_GET
 def client_proxy(request: HttpRequest) -> StreamingHttpResponse:
     """Proxy requests to the Vite dev server during development.
@@ -16,6 +16,9 @@ export const useJobStore = defineStore("job", {
             galaxy_error: "",
             has_monitored: false,
             jobs: {},
+            monitor_data: null,
+            monitor_stream: null,
+            monitor_stream_ids: "",
             running: false,
             timeout: 2000,
             timeout_error: false,
@@ -82,7 +85,7 @@ export const useJobStore = defineStore("job", {
                 return
             }
 
-            const response = await fetch("/api/galaxy/launch/", {
+            let response = await fetch("/api/galaxy/launch/", {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
@@ -94,10 +97,32 @@ export const useJobStore = defineStore("job", {
                 })
             })
 
+            // The job is submitted to Galaxy in the background, so we poll the launch ticket until the job has an ID.
+            let delay = 100
+            const deadline = Date.now() + this.timeout_duration
+            while (response.status === 202) {
+                if (Date.now() >= deadline) {
+                    this.jobs[tool_id].state = "stopped"
+                    this.showErrorWithTimeout(
+                        "Galaxy didn't accept the job in time. Please try again in a few minutes.",
+                        tool_id
+                    )
+
+                    return null
+                }
+
+                const ticket = (await response.json()).ticket
+                await new Promise((resolve) => setTimeout(resolve, delay))
+                delay = Math.min(delay * 2, 2000)
+
+                response = await fetch(`/api/galaxy/launch/${ticket}/`)
+            }
+
             if (response.status === 200) {
                 this.running = true
                 const data = await response.json()
                 this.jobs[tool_id].id = data.id
+                this.refreshMonitorStream()
 
                 return data.id
             } else {
@@ -127,127 +152,154 @@ export const useJobStore = defineStore("job", {
 
             if (response.status === 200) {
                 this.running = true
+                this.refreshMonitorStream()
             } else if (tool_id !== undefined) {
                 this.jobs[tool_id].state = "ready"
 
                 await this.handleError(response, true, tool_id)
             }
         },
-        async monitorJobs() {
+        getJobIds() {
             const job_ids = {}
             for (const j in this.jobs) {
                 job_ids[j] = this.jobs[j].id
             }
+
+            return job_ids
+        },
+        async monitorJobs() {
             const response = await fetch("/api/galaxy/monitor/", {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
                     "X-CSRFToken": Cookies.get("csrftoken")
                 },
-                body: JSON.stringify({ tool_ids: job_ids })
+                body: JSON.stringify({ tool_ids: this.getJobIds() })
             })
 
             if (response.status === 200) {
-                const data = await response.json()
+                this.processJobs(await response.json())
+            } else {
+                await this.handleError(response, false)
+                this.finishMonitor()
+            }
+        },
+        processJobs(data, reprocessing = false) {
+            let hasErrors = false
 
-                let hasErrors = false
+            this.all_jobs = data.jobs
 
-                this.all_jobs = data.jobs
+            // Look for jobs that are running
+            for (const job of data.jobs) {
+                if (job.is_datafile_tool) {
+                    continue
+                }
 
-                // Look for jobs that are running
-                for (const job of data.jobs) {
-                    if (job.is_datafile_tool) {
+                if (!(job.tool_id in this.jobs)) {
+                    if (reprocessing) {
+                        // The job was removed after the job list was received (e.g. its error was
+                        // cleared), so it must not be added back from the old list.
                         continue
                     }
 
-                    if (!(job.tool_id in this.jobs)) {
-                        this.jobs[job.tool_id] = {
-                            id: job.job_id,
-                            start: Date.now(),
-                            submitted: false,
-                            url: "",
-                            url_ready: false
-                        }
+                    this.jobs[job.tool_id] = {
+                        id: job.job_id,
+                        start: Date.now(),
+                        submitted: false,
+                        url: "",
+                        url_ready: false
                     }
+                }
 
-                    this.jobs[job.tool_id].id = job.job_id
-                    if (!["ready", "stopping"].includes(this.jobs[job.tool_id].state)) {
-                        this.jobs[job.tool_id].state = job.state
-                    }
+                this.jobs[job.tool_id].id = job.job_id
+                if (!["ready", "stopping"].includes(this.jobs[job.tool_id].state)) {
+                    this.jobs[job.tool_id].state = job.state
+                }
 
-                    if (["deleted", "deleting", "ok"].includes(job.state)) {
-                        delete this.jobs[job.tool_id]
-                    } else if (job.state === "error") {
-                        hasErrors = true
-                        this.galaxy_error = `Galaxy error: ${job.tool_id} is in an error state`
+                if (["deleted", "deleting", "ok"].includes(job.state)) {
+                    delete this.jobs[job.tool_id]
+                } else if (job.state === "error") {
+                    hasErrors = true
+                    this.galaxy_error = `Galaxy error: ${job.tool_id} is in an error state`
 
-                        // Clear the launch error
+                    // Clear the launch error
+                    if (!reprocessing) {
                         setTimeout(() => {
                             delete this.jobs[job.tool_id]
                         }, this.error_reset_duration)
                     }
+                }
 
-                    if (job.url && !this.jobs[job.tool_id].url_ready) {
-                        this.jobs[job.tool_id].url = job.url
-                        this.jobs[job.tool_id].url_ready = job.url_ready
-                    }
+                if (job.url && !this.jobs[job.tool_id].url_ready) {
+                    this.jobs[job.tool_id].url = job.url
+                    this.jobs[job.tool_id].url_ready = job.url_ready
+                }
 
+                if (
+                    job.state === "running" &&
+                    this.jobs[job.tool_id].state !== "stopping" &&
+                    this.jobs[job.tool_id].state !== "ready" &&
+                    job.url_ready
+                ) {
+                    this.user.getAutoopen()
                     if (
-                        job.state === "running" &&
-                        this.jobs[job.tool_id].state !== "stopping" &&
-                        this.jobs[job.tool_id].state !== "ready" &&
-                        job.url_ready
+                        this.user.autoopen &&
+                        this.allow_autoopen &&
+                        this.jobs[job.tool_id].submitted
                     ) {
-                        this.user.getAutoopen()
-                        if (
-                            this.user.autoopen &&
-                            this.allow_autoopen &&
-                            this.jobs[job.tool_id].submitted
-                        ) {
-                            window.open(job.url, "_blank")
-                        }
-
-                        this.jobs[job.tool_id].state = "ready"
+                        window.open(job.url, "_blank")
                     }
-                }
-
-                // Look for jobs that have stopped running
-                Object.keys(this.jobs).forEach((tool_id) => {
-                    const job = this.jobs[tool_id]
 
-                    if (
-                        !["submitting", "new", "queued", "running"].includes(job.state) &&
-                        !data.jobs.some((target) => target.job_id === job.id)
-                    ) {
-                        // Tool stopped gracefully
-                        delete this.jobs[tool_id]
-                    } else if (
-                        !["error", "running", "ready", "stopping"].includes(job.state) &&
-                        Date.now() - job.start > this.timeout_duration
-                    ) {
-                        // The job hasn't started in one minute, something unexpected has happened.
-                        job.state = "error"
+                    this.jobs[job.tool_id].state = "ready"
+                }
+            }
 
-                        this.showErrorWithTimeout(
-                            `Galaxy error: Tool failed to respond within one minute. This may be due to an outage on ${galaxy_url}.`,
-                            tool_id
-                        )
-                    }
-                })
+            // Look for jobs that have stopped running
+            Object.keys(this.jobs).forEach((tool_id) => {
+                const job = this.jobs[tool_id]
 
-                if (!hasErrors && !this.timeout_error) {
-                    this.galaxy_error = ""
+                if (
+                    !["submitting", "new", "queued", "running"].includes(job.state) &&
+                    !data.jobs.some((target) => target.job_id === job.id)
+                ) {
+                    // Tool stopped gracefully
+                    delete this.jobs[tool_id]
+                } else if (
+                    !["error", "running", "ready", "stopping"].includes(job.state) &&
+                    Date.now() - job.start > this.timeout_duration
+                ) {
+                    // The job hasn't started in one minute, something unexpected has happened.
+                    job.state = "error"
+
+                    this.showErrorWithTimeout(
+                        `Galaxy error: Tool failed to respond within one minute. This may be due to an outage on ${galaxy_url}.`,
+                        tool_id
+                    )
                 }
-            } else {
-                await this.handleError(response, false)
+            })
+
+            if (!hasErrors && !this.timeout_error) {
+                this.galaxy_error = ""
             }
 
+            this.finishMonitor()
+        },
+        finishMonitor() {
             this.updateCalveraSpinner()
 
             if (this.callback !== undefined && this.callback !== null) {
                 this.callback()
             }
 
+            // The stream only reports terminal jobs that the dashboard knows about, so it needs
+            // to be reopened whenever that changes.
+            if (
+                this.monitor_stream !== null &&
+                JSON.stringify(this.getJobIds()) !== this.monitor_stream_ids
+            ) {
+                this.openMonitorStream()
+            }
+
             // nextTick ensures that any updates to the UI from this monitoring loop have been committed.
             // Setting this flag will allow users to launch tools, which should only be possible after
             // the UI has been updated with the results of the initial monitoring.
@@ -260,6 +312,11 @@ export const useJobStore = defineStore("job", {
             this.callback = callback
             this.monitoring_autolaunch = monitoring_autolaunch
 
+            if (window.EventSource !== undefined) {
+                this.openMonitorStream()
+                return
+            }
+
             if (this.monitor_interval === null) {
                 this.monitorJobs()
             } else {
@@ -269,6 +326,59 @@ export const useJobStore = defineStore("job", {
 
             this.monitor_interval = window.setInterval(this.monitorJobs, this.timeout)
         },
+        openMonitorStream() {
+            this.stopMonitor()
+
+            // The new stream sends the current job list as soon as it opens.
+            this.monitor_data = null
+            this.monitor_stream_ids = JSON.stringify(this.getJobIds())
+            const params = new URLSearchParams({ tool_ids: this.monitor_stream_ids })
+            const stream = new EventSource(`/api/galaxy/monitor/stream/?${params}`)
+            this.monitor_stream = stream
+
+            // The server only sends the job list when it changes.
+            stream.onmessage = (event) => {
+                this.monitor_data = JSON.parse(event.data)
+                this.processJobs(this.monitor_data)
+            }
+            stream.addEventListener("galaxy_error", (event) => {
+                this.galaxy_error = `Galaxy error: ${JSON.parse(event.data).error}`
+                this.finishMonitor()
+            })
+            stream.onerror = () => {
+                if (stream.readyState === EventSource.CLOSED && this.monitor_stream === stream) {
+                    // The stream was rejected (e.g. the user's login expired), so we fall back to
+                    // polling, which knows how to report the error.
+                    this.stopMonitor()
+                    this.monitorJobs()
+                    this.monitor_interval = window.setInterval(this.monitorJobs, this.timeout)
+                }
+            }
+
+            // Reprocessing the last job list allows launch timeouts to be detected between updates.
+            this.monitor_interval = window.setInterval(() => {
+                if (this.monitor_data !== null) {
+                    this.processJobs(this.monitor_data, true)
+                }
+            }, this.timeout)
+        },
+        refreshMonitorStream() {
+            // Reopening the stream makes the server scan Galaxy immediately instead of backing off.
+            if (this.monitor_stream !== null) {
+                this.openMonitorStream()
+            }
+        },
+        stopMonitor() {
+            if (this.monitor_stream !== null) {
+                this.monitor_stream.close()
+                this.monitor_stream = null
+            }
+
+            if (this.monitor_interval !== null) {
+                window.clearInterval(this.monitor_interval)
+                this.monitor_interval = null
+            }
+        },
         updateCalveraSpinner() {
             // Turn on the spinner in the footer if any job is being started or stopped
             this.running = Object.values(this.jobs).some((job) => {
@@ -0,0 +1,60 @@
+"""Configures the dashboard for the tests.
+
+Like the benchmarks, the tests don't depend on the local .env file. Each run uses its own temporary database and cache,
+and the tests don't connect to Galaxy or the OAuth providers.
+"""
+
+import os
+from tempfile import TemporaryDirectory
+from typing import Iterator
+
+import django
+import pytest
+from cryptography.fernet import Fernet
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test.utils import setup_test_environment
+
+_directory = TemporaryDirectory()
+
+os.environ.update(
+    {
+        "DJANGO_SETTINGS_MODULE": "src.launcher_app.settings",
+        "DEBUG": "false",
+        "SECRET_KEY": "test-secret-key",
+        "REFRESH_TOKEN_KEY": Fernet.generate_key().decode(),
+        "BASE_URL": "http://localhost:8080",
+        "DATABASE_URL": f"sqlite:///{os.path.join(_directory.name, 'db.sqlite3')}",
+        "CACHE_BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "CACHE_LOCATION": "tests",
+        "GALAXY_URL": "http://galaxy.invalid",
+        "GALAXY_API_KEY_ENDPOINT": "/api/authenticate/baseauth",
+        "GALAXY_HISTORY_NAME": "test_history",
+        "TOOL_PREFIX": "nova",
+        "ALERTS_FORMAT": "prometheus",
+        "ALERTS_ENVIRONMENTS": '["prod", "test"]',
+        "ALERTS_URL": "http://prometheus.invalid/api/v1/alerts",
+        "TARGETS_URL": "http://prometheus.invalid/api/v1/targets",
+    }
+)
+for provider in ["UCAMS", "XCAMS"]:
+    for setting in ["AUTH_URL", "TOKEN_URL", "CLIENT_ID", "CLIENT_SECRET", "REDIRECT_PATH", "SCOPES"]:
+        os.environ[f"{provider}_{setting}"] = provider.lower()
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+django.setup()
+# Lets the test client use the default host name, among other things.
+setup_test_environment()
+
+
+@pytest.fixture(scope="session")
+def database() -> None:
+    """Creates the tables in the temporary database."""
+    call_command("migrate", verbosity=0)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache() -> Iterator[None]:
+    """Keeps cached values from leaking between tests."""
+    yield
+    cache.clear()
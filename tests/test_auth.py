@@ -0,0 +1,238 @@
+"""Tests for the OAuth session state: how often it is written, logging in, refreshing tokens and verifying API keys."""
+
+from asyncio import run
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from typing import Any, List
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection, connections
+from django.http import HttpRequest, HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from httpx import Request, Response
+from requests_oauthlib import OAuth2Session
+
+from src.launcher_app import auth
+from src.launcher_app.auth import AuthManager
+from src.launcher_app.caching import acquire
+from src.launcher_app.models import OAuthSessionState
+
+pytestmark = pytest.mark.usefixtures("database")
+
+TOKENS = {"access_token": "access", "refresh_token": "refresh", "expires_in": 3600}
+
+
+def create_auth_manager(username: str) -> AuthManager:
+    user = get_user_model().objects.create_user(username=username)  # type: ignore
+    OAuthSessionState.objects.create(user=user, session_type="ucams", galaxy_api_key="api-key")
+    request = RequestFactory().get("/")
+    request.user = user
+
+    return AuthManager(request)
+
+
+def add_session(request: HttpRequest) -> HttpRequest:
+    SessionMiddleware(lambda request: HttpResponse()).process_request(request)
+
+    return request
+
+
+def get_writes(queries: CaptureQueriesContext) -> List[str]:
+    return [query["sql"] for query in queries.captured_queries if query["sql"].startswith(("INSERT", "UPDATE"))]
+
+
+def test_flush_writes_changes_once() -> None:
+    auth_manager = create_auth_manager("flush@example.com")
+
+    with CaptureQueriesContext(connection) as queries:
+        auth_manager.save_tokens(TOKENS)
+        auth_manager.flush()
+
+    writes = get_writes(queries)
+    assert len(writes) == 1
+    # Only the changed fields are written.
+    assert "galaxy_api_key" not in writes[0]
+    assert "refresh_token" in writes[0]
+
+    state = OAuthSessionState.objects.get(pk=auth_manager.oauth_state.pk)
+    assert state.access_token == "access"
+    assert auth_manager.get_refresh_token() == "refresh"
+
+
+def test_flush_without_changes() -> None:
+    auth_manager = create_auth_manager("unchanged@example.com")
+
+    with CaptureQueriesContext(connection) as queries:
+        auth_manager.flush()
+        auth_manager.save_tokens(TOKENS)
+        auth_manager.flush()
+        auth_manager.flush()
+
+    assert len(get_writes(queries)) == 1
+
+
+def test_delete_galaxy_api_key() -> None:
+    auth_manager = create_auth_manager("delete@example.com")
+
+    with CaptureQueriesContext(connection) as queries:
+        auth_manager.delete_galaxy_api_key()
+
+    assert len(get_writes(queries)) == 1
+    assert OAuthSessionState.objects.get(pk=auth_manager.oauth_state.pk).galaxy_api_key == ""
+
+
+def test_anonymous_visitors_dont_write() -> None:
+    request = RequestFactory().get("/")
+    request.user = AnonymousUser()
+
+    with CaptureQueriesContext(connection) as queries:
+        auth_manager = AuthManager(request)
+
+    assert get_writes(queries) == []
+    assert auth_manager.oauth_state.pk is None
+
+
+def test_login() -> None:
+    request = add_session(RequestFactory().get("/"))
+    request.user = AnonymousUser()
+    auth_manager = AuthManager(request)
+    auth_manager.start_login()
+
+    auth_manager.save_tokens(TOKENS)
+    auth_manager.login(request, "login@example.com", "Login")
+
+    state = OAuthSessionState.objects.get(user__username="login@example.com")
+    assert state.pk == auth_manager.oauth_state.pk
+    assert state.access_token == "access"
+
+
+def test_login_again_while_logged_in() -> None:
+    # Users who are still logged in are asked to log in again when their Galaxy API key can't be retrieved.
+    auth_manager = create_auth_manager("again@example.com")
+    request = add_session(RequestFactory().get("/"))
+    request.user = auth_manager.oauth_state.user
+    auth_manager = AuthManager(request)
+
+    auth_manager.update_state(session_type="xcams")
+    auth_manager.save_tokens(TOKENS)
+    auth_manager.login(request, "again@example.com", "Again")
+
+    state = OAuthSessionState.objects.get(user__username="again@example.com")
+    assert state.pk == auth_manager.oauth_state.pk
+    assert state.session_type == "xcams"
+    assert state.access_token == "access"
+
+
+class FakeRefresh:
+    """Counts the token refreshes and returns new tokens from each one after a delay."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.calls = 0
+
+    def __call__(self, token_url: str, **kwargs: Any) -> dict[str, Any]:
+        self.calls += 1
+        sleep(0.3)
+
+        return {**TOKENS, "access_token": f"access {self.calls}"}
+
+
+def create_expired_auth_manager(username: str) -> AuthManager:
+    auth_manager = create_auth_manager(username)
+    # Tokens without a known lifetime are refreshed every time they are needed.
+    auth_manager.save_tokens({**TOKENS, "expires_in": None})
+    auth_manager.flush()
+
+    return auth_manager
+
+
+def test_concurrent_token_refreshes(monkeypatch: pytest.MonkeyPatch) -> None:
+    refresh = FakeRefresh()
+    monkeypatch.setattr(OAuth2Session, "refresh_token", refresh)
+    user = create_expired_auth_manager("refresh@example.com").oauth_state.user
+
+    def get_access_token() -> str:
+        request = RequestFactory().get("/")
+        request.user = user
+        try:
+            return AuthManager(request).get_access_token()
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(3) as executor:
+        tokens = list(executor.map(lambda _: get_access_token(), range(3)))
+
+    assert tokens == ["access 1"] * 3
+    assert refresh.calls == 1
+    assert OAuthSessionState.objects.get(user=user).access_token == "access 1"
+
+
+def test_token_refresh_wait_is_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    refresh = FakeRefresh()
+    monkeypatch.setattr(OAuth2Session, "refresh_token", refresh)
+    monkeypatch.setattr(auth, "TOKEN_REFRESH_WAIT_TIMEOUT", 0.3)
+    auth_manager = create_expired_auth_manager("wait@example.com")
+    # Another request is refreshing the tokens.
+    acquire(f"oauth_token_refresh:{auth_manager.oauth_state.pk}", 10)
+
+    with pytest.raises(Exception, match="Please try again"):
+        auth_manager.get_access_token()
+
+    assert refresh.calls == 0
+
+
+class FakeGalaxyClient:
+    """Answers requests for the current Galaxy user with the given response."""
+
+    def __init__(self, status_code: int, user: dict[str, Any]):
+        """Init."""
+        self.status_code = status_code
+        self.user = user
+        self.api_keys: List[str] = []
+
+    async def get(self, url: str, headers: dict[str, str]) -> Response:
+        self.api_keys.append(headers["x-api-key"])
+
+        return Response(self.status_code, json=self.user, request=Request("GET", url))
+
+
+@pytest.mark.parametrize(
+    "status_code, user, valid",
+    [(200, {"id": "user"}, True), (200, {}, False), (403, {"err_msg": "Provided API key is not valid."}, False)],
+)
+def test_verify_galaxy_api_key(
+    monkeypatch: pytest.MonkeyPatch, status_code: int, user: dict[str, Any], valid: bool
+) -> None:
+    client = FakeGalaxyClient(status_code, user)
+    monkeypatch.setattr(auth, "get_async_client", lambda: client)
+    auth_manager = create_auth_manager(f"verify{status_code}{len(user)}@example.com")
+
+    assert run(auth_manager.verify_galaxy_api_key()) is valid
+    assert client.api_keys == ["api-key"]
+
+
+def test_verify_missing_galaxy_api_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = FakeGalaxyClient(200, {"id": "user"})
+    monkeypatch.setattr(auth, "get_async_client", lambda: client)
+    auth_manager = create_auth_manager("missing-key@example.com")
+    auth_manager.delete_galaxy_api_key()
+
+    assert not run(auth_manager.verify_galaxy_api_key())
+    assert client.api_keys == []
+
+
+def test_user_status_keeps_valid_galaxy_api_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = FakeGalaxyClient(200, {"id": "user"})
+    monkeypatch.setattr(auth, "get_async_client", lambda: client)
+    auth_manager = create_auth_manager("user-status@example.com")
+    dashboard = Client()
+    dashboard.force_login(auth_manager.oauth_state.user)  # type: ignore
+
+    response = dashboard.get("/api/galaxy/user_status/")
+
+    assert response.json() == {"status": "ok"}
+    assert OAuthSessionState.objects.get(pk=auth_manager.oauth_state.pk).galaxy_api_key == "api-key"
@@ -0,0 +1,184 @@
+"""Tests for sharing expensive results between concurrent callers."""
+
+from asyncio import gather, run, sleep
+from multiprocessing import get_context
+from multiprocessing.synchronize import Barrier
+from pathlib import Path
+from time import monotonic, time
+from time import sleep as sync_sleep
+from typing import Any, List, Tuple
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+
+from src.launcher_app.caching import acquire, coalesce, get_or_refresh
+from src.launcher_app.galaxy import TOOLS_CACHE_KEY, GalaxyManager
+
+KEY = "test_coalesce"
+
+
+class Builder:
+    """Counts its calls and returns a new value from each one after a delay."""
+
+    def __init__(self, delay: float = 0, failures: int = 0):
+        """Init."""
+        self.calls = 0
+        self.delay = delay
+        self.failures = failures
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await sleep(self.delay)
+        if self.calls <= self.failures:
+            raise ValueError("Galaxy is down")
+
+        return f"value {self.calls}"
+
+
+def test_reuses_result() -> None:
+    builder = Builder()
+
+    assert run(coalesce(KEY, 10, builder, wait_timeout=1)) == "value 1"
+    assert run(coalesce(KEY, 10, builder, wait_timeout=1)) == "value 1"
+    assert builder.calls == 1
+
+
+def test_returns_cached_result() -> None:
+    cache.set(KEY, {"value": "cached"})
+    builder = Builder()
+
+    assert run(coalesce(KEY, 10, builder, wait_timeout=1)) == "cached"
+    assert builder.calls == 0
+
+
+def test_disabled_without_window() -> None:
+    builder = Builder()
+
+    run(coalesce(KEY, 0, builder, wait_timeout=1))
+    run(coalesce(KEY, 0, builder, wait_timeout=1))
+
+    assert builder.calls == 2
+    assert cache.get(KEY) is None
+
+
+def test_waits_for_other_builder() -> None:
+    builder = Builder(delay=0.2)
+
+    async def coalesce_concurrently() -> List[Any]:
+        return await gather(*[coalesce(KEY, 10, builder, wait_timeout=5) for _ in range(3)])
+
+    assert run(coalesce_concurrently()) == ["value 1"] * 3
+    assert builder.calls == 1
+
+
+def test_builds_after_other_builder_fails() -> None:
+    builder = Builder(delay=0.2, failures=1)
+
+    async def wait_for_first() -> Any:
+        # Starts once the first call holds the lock.
+        await sleep(0.05)
+        return await coalesce(KEY, 10, builder, wait_timeout=5)
+
+    async def coalesce_concurrently() -> Tuple[Any, Any]:
+        return await gather(coalesce(KEY, 10, builder, wait_timeout=5), wait_for_first(), return_exceptions=True)
+
+    first, second = run(coalesce_concurrently())
+
+    assert isinstance(first, ValueError)
+    assert second == "value 2"
+    assert builder.calls == 2
+    assert cache.get(f"{KEY}:building") is None
+
+
+def test_failure_isnt_cached() -> None:
+    builder = Builder(failures=1)
+
+    with pytest.raises(ValueError):
+        run(coalesce(KEY, 10, builder, wait_timeout=1))
+
+    assert run(coalesce(KEY, 10, builder, wait_timeout=1)) == "value 2"
+
+
+def acquire_in_process(barrier: Barrier, results: Any) -> None:
+    barrier.wait()
+    results.put(acquire("test_acquire", 10))
+
+
+def test_acquire_across_processes(tmp_path: Path) -> None:
+    # The file-based backend doesn't add keys atomically by itself.
+    backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)}
+    with override_settings(CACHES={"default": backend}):
+        context = get_context("fork")
+        barrier = context.Barrier(8)
+        results = context.Queue()
+        processes = [context.Process(target=acquire_in_process, args=(barrier, results)) for _ in range(8)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert sorted(results.get() for _ in processes) == [False] * 7 + [True]
+        assert not acquire("test_acquire", 10)
+        cache.delete("test_acquire")
+        assert acquire("test_acquire", 10)
+
+
+def wait_for_refresh(key: str, builder: Builder) -> None:
+    deadline = monotonic() + 5
+    while cache.get(f"{key}:refreshing") is not None or not builder.calls:
+        assert monotonic() < deadline
+        sync_sleep(0.01)
+
+
+def test_get_or_refresh_builds_missing_value() -> None:
+    builder = Builder()
+
+    assert run(get_or_refresh(KEY, 10, builder)) == "value 1"
+    assert run(get_or_refresh(KEY, 10, builder)) == "value 1"
+    assert builder.calls == 1
+
+
+def test_get_or_refresh_serves_stale_value_while_refreshing() -> None:
+    cache.set(KEY, {"time": time() - 60, "value": "stale"})
+    builder = Builder(delay=0.2)
+
+    async def get_concurrently() -> List[Any]:
+        return await gather(*[get_or_refresh(KEY, 10, builder) for _ in range(3)])
+
+    assert run(get_concurrently()) == ["stale"] * 3
+    wait_for_refresh(KEY, builder)
+
+    assert builder.calls == 1
+    assert run(get_or_refresh(KEY, 10, builder)) == "value 1"
+
+
+def test_get_or_refresh_keeps_stale_value_after_failure() -> None:
+    cache.set(KEY, {"time": time() - 60, "value": "stale"})
+    builder = Builder(failures=1)
+
+    assert run(get_or_refresh(KEY, 10, builder)) == "stale"
+    wait_for_refresh(KEY, builder)
+
+    assert cache.get(KEY)["value"] == "stale"
+    # The next request after the failure tries again.
+    assert run(get_or_refresh(KEY, 10, builder)) == "stale"
+    wait_for_refresh(KEY, builder)
+    assert cache.get(KEY)["value"] == "value 2"
+
+
+def test_refresh_tools_keeps_tool_list_after_failure(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache.set(TOOLS_CACHE_KEY, {"time": time(), "value": {"tools": "cached"}})
+    builder = Builder(failures=1)
+
+    async def build_tools(galaxy_manager: GalaxyManager, reuse_descriptions: bool = True) -> str:
+        return await builder()
+
+    monkeypatch.setattr(GalaxyManager, "_build_tools", build_tools)
+
+    with pytest.raises(ValueError):
+        run(GalaxyManager().refresh_tools())
+    assert run(GalaxyManager().get_tools()) == {"tools": "cached"}
+
+    assert run(GalaxyManager().refresh_tools()) == "value 2"
+    assert run(GalaxyManager().get_tools()) == "value 2"
@@ -0,0 +1,311 @@
+"""Tests for launching jobs in the background, tracking them with tickets and registering their files."""
+
+from asyncio import run
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from time import monotonic, time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest
+from django.test import Client, RequestFactory, override_settings
+from django.utils.timezone import now
+
+from src.launcher_app import galaxy, views
+from src.launcher_app.auth import AuthManager
+from src.launcher_app.galaxy import LAUNCH_PENDING_MARGIN, GalaxyManager, get_launch_ticket, get_launch_tickets
+from src.launcher_app.models import IngestedFile, OAuthSessionState
+from src.launcher_app.pool import PooledConnection
+
+pytestmark = pytest.mark.usefixtures("database")
+
+HISTORY_ID = "history"
+BATCH_URL = "/api/galaxy/launch/batch/"
+
+
+class FakePooledConnection(PooledConnection):
+    """Pooled connection with known history IDs that doesn't connect to Galaxy."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.api_key = "api-key"
+        self.last_used = monotonic()
+        self.history_ids = {
+            settings.GALAXY_HISTORY_NAME: HISTORY_ID,
+            f"{settings.GALAXY_HISTORY_NAME}_datafile_tools": HISTORY_ID,
+            f"{settings.GALAXY_HISTORY_NAME}_data": HISTORY_ID,
+        }
+
+    @contextmanager
+    def connect(self) -> Iterator[None]:  # type: ignore
+        yield None
+
+
+def create_galaxy_manager(username: str) -> GalaxyManager:
+    user = get_user_model().objects.create_user(username=username)  # type: ignore
+    OAuthSessionState.objects.create(user=user, session_type="ucams", galaxy_api_key="api-key")
+    request = RequestFactory().get("/")
+    request.user = user
+
+    galaxy_manager = GalaxyManager()
+    galaxy_manager.auth_manager = AuthManager(request)
+    galaxy_manager.connection = FakePooledConnection()
+
+    return galaxy_manager
+
+
+@override_settings(GALAXY_LAUNCH_TIMEOUT=0.2)
+def test_stalled_registration_fails_launch() -> None:
+    galaxy_manager = create_galaxy_manager("stalled@example.com")
+    # The file is never registered.
+    ingests: Dict[str, Future] = {"file_/data/run.nxs": Future()}
+
+    start = monotonic()
+    galaxy_manager._run_launch("stalled", time(), "tool", {"input": "file_/data/run.nxs"}, ingests)
+
+    assert monotonic() - start < 2
+    ticket = run(get_launch_ticket("stalled", galaxy_manager.auth_manager.oauth_state.user_id))  # type: ignore
+    assert ticket is not None
+    assert ticket["state"] == "failed"
+    assert "wasn't registered to Galaxy" in ticket["error"]
+
+
+def test_failed_registration_fails_launch() -> None:
+    galaxy_manager = create_galaxy_manager("missing@example.com")
+    ingest: Future = Future()
+    ingest.set_result(None)
+
+    galaxy_manager._run_launch(
+        "missing", time(), "tool", {"input": "file_/data/missing.nxs"}, {"file_/data/missing.nxs": ingest}
+    )
+
+    ticket = run(get_launch_ticket("missing", galaxy_manager.auth_manager.oauth_state.user_id))  # type: ignore
+    assert ticket is not None
+    assert ticket["state"] == "failed"
+    assert "failed to register" in ticket["error"]
+
+
+def test_lost_launches_fail() -> None:
+    galaxy_manager = create_galaxy_manager("lost@example.com")
+    user_id = galaxy_manager.auth_manager.oauth_state.user_id  # type: ignore
+    galaxy_manager._save_launch_ticket("recent", "pending", created=time())
+    galaxy_manager._save_launch_ticket(
+        "lost", "pending", created=time() - settings.GALAXY_LAUNCH_TIMEOUT - LAUNCH_PENDING_MARGIN - 1
+    )
+
+    tickets = run(get_launch_tickets(["recent", "lost", "unknown"], user_id))
+
+    assert tickets["recent"] is not None and tickets["recent"]["state"] == "pending"
+    assert tickets["lost"] is not None and tickets["lost"]["state"] == "failed"
+    assert tickets["unknown"] is None
+
+
+def test_tickets_are_private() -> None:
+    galaxy_manager = create_galaxy_manager("private@example.com")
+    galaxy_manager._save_launch_ticket("private", "submitted", created=time(), job_id="job")
+    other_user = get_user_model().objects.create_user(username="other@example.com")  # type: ignore
+
+    assert run(get_launch_ticket("private", other_user.pk)) is None
+
+
+class FakeGalaxyManager:
+    """Records submitted launches without contacting Galaxy."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.launches: List[Tuple[str, Dict[str, str]]] = []
+
+    def submit_launches(self, launches: List[Tuple[str, Dict[str, str]]]) -> List[str]:
+        self.launches.extend(launches)
+
+        return [f"ticket{i}" for i in range(len(launches))]
+
+
+@pytest.fixture
+def galaxy_manager(monkeypatch: pytest.MonkeyPatch) -> FakeGalaxyManager:
+    galaxy_manager = FakeGalaxyManager()
+
+    def create_galaxy_manager(request: HttpRequest) -> FakeGalaxyManager:
+        return galaxy_manager
+
+    monkeypatch.setattr(views, "create_galaxy_manager", create_galaxy_manager)
+
+    return galaxy_manager
+
+
+def create_client(username: str) -> Client:
+    client = Client()
+    client.force_login(get_user_model().objects.get_or_create(username=username)[0])
+
+    return client
+
+
+def test_batch_launch(galaxy_manager: FakeGalaxyManager) -> None:
+    client = create_client("batch@example.com")
+    launches = [{"tool_id": "tool1", "inputs": {"input": "file_/data/run.nxs"}}, {"tool_id": "tool2"}]
+
+    response = client.post(BATCH_URL, {"launches": launches}, content_type="application/json")
+
+    assert response.status_code == 202
+    assert response.json() == {"tickets": ["ticket0", "ticket1"]}
+    assert galaxy_manager.launches == [("tool1", {"input": "file_/data/run.nxs"}), ("tool2", {})]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "not json",
+        [],
+        {},
+        {"launches": {"tool_id": "tool"}},
+        {"launches": ["tool"]},
+        {"launches": [{"inputs": {}}]},
+        {"launches": [{"tool_id": 1}]},
+        {"launches": [{"tool_id": "tool", "inputs": ["input"]}]},
+        {"launches": [{"tool_id": "tool", "inputs": {"input": 1}}]},
+    ],
+)
+def test_malformed_batch_is_rejected(galaxy_manager: FakeGalaxyManager, body: Any) -> None:
+    client = create_client("malformed@example.com")
+
+    response = client.post(BATCH_URL, body, content_type="application/json")
+
+    assert response.status_code == 400
+    assert "error" in response.json()
+    assert galaxy_manager.launches == []
+
+
+@override_settings(GALAXY_LAUNCH_BATCH_MAX_SIZE=2)
+def test_oversized_batch_is_rejected(galaxy_manager: FakeGalaxyManager) -> None:
+    client = create_client("oversized@example.com")
+
+    response = client.post(BATCH_URL, {"launches": [{"tool_id": "tool"}] * 3}, content_type="application/json")
+    assert response.status_code == 400
+    assert galaxy_manager.launches == []
+
+    response = client.get(BATCH_URL, {"tickets": "ticket1,ticket2,ticket3"})
+    assert response.status_code == 400
+
+
+def test_batch_launch_status() -> None:
+    galaxy_manager = create_galaxy_manager("status@example.com")
+    galaxy_manager._save_launch_ticket("submitted", "submitted", created=time(), job_id="job")
+    galaxy_manager._save_launch_ticket("pending", "pending", created=time())
+    client = Client()
+    client.force_login(galaxy_manager.auth_manager.oauth_state.user)  # type: ignore
+
+    response = client.get(BATCH_URL, {"tickets": "submitted,pending,unknown"})
+
+    assert response.status_code == 200
+    assert response.json()["launches"] == [
+        {"ticket": "submitted", "state": "submitted", "id": "job"},
+        {"ticket": "pending", "state": "pending"},
+        {"ticket": "unknown", "state": "failed", "error": "Launch ticket not found."},
+    ]
+
+
+def test_batch_launch_requires_login(galaxy_manager: FakeGalaxyManager) -> None:
+    response = Client().post(BATCH_URL, {"launches": [{"tool_id": "tool"}]}, content_type="application/json")
+
+    assert response.status_code == 403
+    assert galaxy_manager.launches == []
+
+
+class FakeGalaxyDatasets:
+    """Registers files as datasets and tracks which datasets were deleted."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.registered: List[str] = []
+        self.deleted: List[str] = []
+
+    def register(self) -> str:
+        self.registered.append(f"dataset{len(self.registered)}")
+
+        return self.registered[-1]
+
+    def show_dataset(self, dataset_id: str) -> Dict[str, Any]:
+        return {"id": dataset_id, "state": "ok", "deleted": dataset_id in self.deleted}
+
+
+@pytest.fixture
+def datasets(monkeypatch: pytest.MonkeyPatch) -> FakeGalaxyDatasets:
+    datasets = FakeGalaxyDatasets()
+
+    class FakeTool:
+        """Runs the registration tool without Galaxy."""
+
+        def __init__(self, tool_id: str):
+            """Init."""
+            assert tool_id == "neutrons_register"
+
+        def run(self, data_store: Any, params: Any) -> Any:
+            return SimpleNamespace(data=[SimpleNamespace(id=datasets.register())])
+
+    monkeypatch.setattr(galaxy, "Tool", FakeTool)
+
+    return datasets
+
+
+def ingest_file(galaxy_manager: GalaxyManager, datasets: FakeGalaxyDatasets, path: Path) -> Optional[str]:
+    connection = SimpleNamespace(galaxy_instance=SimpleNamespace(datasets=datasets))
+
+    return galaxy_manager.ingest_file(connection, f"file_{path}")  # type: ignore
+
+
+def test_unchanged_files_are_reused(datasets: FakeGalaxyDatasets, tmp_path: Path) -> None:
+    galaxy_manager = create_galaxy_manager("reuse@example.com")
+    path = tmp_path / "run.nxs"
+    path.write_bytes(b"data")
+
+    assert ingest_file(galaxy_manager, datasets, path) == "dataset0"
+    assert ingest_file(galaxy_manager, datasets, path) == "dataset0"
+
+    path.write_bytes(b"more data")
+    assert ingest_file(galaxy_manager, datasets, path) == "dataset1"
+    assert datasets.registered == ["dataset0", "dataset1"]
+    assert IngestedFile.objects.get(path=f"file_{path}").dataset_id == "dataset1"
+
+
+def test_deleted_datasets_are_registered_again(datasets: FakeGalaxyDatasets, tmp_path: Path) -> None:
+    galaxy_manager = create_galaxy_manager("deleted@example.com")
+    path = tmp_path / "run.nxs"
+    path.write_bytes(b"data")
+    ingest_file(galaxy_manager, datasets, path)
+
+    datasets.deleted.append("dataset0")
+
+    assert ingest_file(galaxy_manager, datasets, path) == "dataset1"
+    assert IngestedFile.objects.get(path=f"file_{path}").dataset_id == "dataset1"
+
+
+def test_invisible_files_arent_reused(datasets: FakeGalaxyDatasets, tmp_path: Path) -> None:
+    # Without the file, we can't tell whether it changed.
+    galaxy_manager = create_galaxy_manager("invisible@example.com")
+    path = tmp_path / "missing.nxs"
+
+    assert ingest_file(galaxy_manager, datasets, path) == "dataset0"
+    assert ingest_file(galaxy_manager, datasets, path) == "dataset1"
+    assert not IngestedFile.objects.filter(path=f"file_{path}").exists()
+
+
+@override_settings(GALAXY_INGEST_CACHE_MAX_AGE=60)
+def test_unused_files_are_evicted(datasets: FakeGalaxyDatasets, tmp_path: Path) -> None:
+    galaxy_manager = create_galaxy_manager("evict@example.com")
+    old_path, new_path = tmp_path / "old.nxs", tmp_path / "new.nxs"
+    old_path.write_bytes(b"old")
+    new_path.write_bytes(b"new")
+    ingest_file(galaxy_manager, datasets, old_path)
+    # last_used is set automatically whenever the file is saved.
+    IngestedFile.objects.filter(path=f"file_{old_path}").update(last_used=now() - timedelta(seconds=61))
+
+    ingest_file(galaxy_manager, datasets, new_path)
+
+    assert list(IngestedFile.objects.filter(user__username="evict@example.com").values_list("path", flat=True)) == [
+        f"file_{new_path}"
+    ]
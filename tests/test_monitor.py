@@ -0,0 +1,165 @@
+"""Tests for scanning Galaxy for the user's jobs and probing whether they are ready."""
+
+from asyncio import run, sleep
+from time import monotonic, time
+from typing import Any, Dict, List
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+
+from src.launcher_app.galaxy import GalaxyManager
+
+JOBS = [{"id": f"job{i}", "tool_id": f"tool{i}", "state": "running"} for i in range(3)]
+
+
+class FakeGalaxy:
+    """Serves the job lists and looks up the URL of each job after a delay."""
+
+    def __init__(self, jobs: List[Dict[str, Any]], delays: Dict[str, float]):
+        """Init."""
+        self.jobs = jobs
+        self.delays = delays
+        self.url_lookups: List[str] = []
+        self.readiness_checks: List[str] = []
+
+    async def get_history_id(self, name: str) -> str:
+        return name
+
+    async def galaxy_get(self, call: str, path: str, timeout: Any = None, **params: Any) -> Any:
+        # Only the main history's nonterminal jobs are listed.
+        if params["history_id"].endswith("_datafile_tools") or "limit" in params:
+            return []
+
+        return [dict(job) for job in self.jobs]
+
+    async def get_job_url(self, job: Dict[str, Any]) -> str:
+        self.url_lookups.append(job["id"])
+        await sleep(self.delays.get(job["id"], 0))
+
+        return f"http://galaxy/{job['id']}"
+
+    async def is_url_ready(self, url: str) -> bool:
+        self.readiness_checks.append(url)
+
+        return True
+
+
+def create_galaxy_manager(galaxy: FakeGalaxy) -> GalaxyManager:
+    galaxy_manager = GalaxyManager()
+    galaxy_manager._aget_history_id = galaxy.get_history_id  # type: ignore
+    galaxy_manager._galaxy_get = galaxy.galaxy_get  # type: ignore
+    galaxy_manager._get_job_url = galaxy.get_job_url  # type: ignore
+    galaxy_manager._is_url_ready = galaxy.is_url_ready  # type: ignore
+
+    return galaxy_manager
+
+
+def test_probes_jobs_concurrently() -> None:
+    galaxy = FakeGalaxy(JOBS, {job["id"]: 0.3 for job in JOBS})
+
+    start = monotonic()
+    jobs = run(create_galaxy_manager(galaxy)._scan_jobs())
+
+    assert monotonic() - start < 0.6
+    assert sorted(galaxy.url_lookups) == ["job0", "job1", "job2"]
+    assert all(job["url_ready"] for job in jobs)
+
+
+@override_settings(GALAXY_MONITOR_DEADLINE=0.2)
+def test_slow_probes_are_reported_not_ready() -> None:
+    galaxy = FakeGalaxy(JOBS, {"job2": 5})
+
+    start = monotonic()
+    jobs = {job["job_id"]: job for job in run(create_galaxy_manager(galaxy)._scan_jobs())}
+
+    assert monotonic() - start < 1
+    assert jobs["job0"]["url_ready"] and jobs["job1"]["url_ready"]
+    assert not jobs["job2"]["url_ready"]
+    # The slow job is probed again after a backoff.
+    assert cache.get("galaxy_probe:job2")["failures"] == 1
+
+
+def test_ready_jobs_are_pinned() -> None:
+    galaxy = FakeGalaxy(JOBS, {})
+    galaxy_manager = create_galaxy_manager(galaxy)
+    run(galaxy_manager._scan_jobs())
+
+    jobs = run(galaxy_manager._scan_jobs())
+
+    assert len(galaxy.readiness_checks) == len(JOBS)
+    assert all(job["url_ready"] and job["url"] for job in jobs)
+
+
+def test_jobs_are_probed_again_after_state_change() -> None:
+    galaxy = FakeGalaxy(JOBS, {})
+    galaxy_manager = create_galaxy_manager(galaxy)
+    run(galaxy_manager._scan_jobs())
+
+    galaxy.jobs = [{**JOBS[0], "state": "queued"}]
+    run(galaxy_manager._scan_jobs())
+
+    # The job's URL doesn't change, so only its readiness is checked again.
+    assert galaxy.url_lookups == ["job0", "job1", "job2"]
+    assert galaxy.readiness_checks == [f"http://galaxy/{job['id']}" for job in JOBS] + ["http://galaxy/job0"]
+
+
+def test_load_probe() -> None:
+    galaxy_manager = GalaxyManager()
+    job = JOBS[0]
+    probe = {"state": "running", "url": "http://galaxy/job0", "ready": True, "failures": 0, "next_probe": 0.0}
+
+    assert galaxy_manager._load_probe(job, None) == {
+        "state": "running",
+        "url": "",
+        "ready": False,
+        "failures": 0,
+        "next_probe": 0.0,
+    }
+    loaded = galaxy_manager._load_probe(job, probe)
+    assert loaded == probe and loaded is not probe
+    # The URL is kept when the job changes state, but whether it is ready isn't.
+    assert galaxy_manager._load_probe(
+        {**job, "state": "queued"}, {**probe, "failures": 3, "next_probe": time() + 8}
+    ) == {
+        **probe,
+        "state": "queued",
+        "ready": False,
+    }
+
+
+@override_settings(GALAXY_PROBE_MAX_BACKOFF=16)
+def test_back_off() -> None:
+    galaxy_manager = GalaxyManager()
+    probe = {"failures": 0, "next_probe": 0.0}
+
+    delays = []
+    for _ in range(6):
+        galaxy_manager._back_off(probe)
+        delays.append(round(probe["next_probe"] - time()))
+
+    assert probe["failures"] == 6
+    assert delays == [2, 4, 8, 16, 16, 16]
+
+
+def test_unready_jobs_are_probed_after_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    galaxy = FakeGalaxy(JOBS[:1], {})
+    galaxy_manager = create_galaxy_manager(galaxy)
+    ready = False
+
+    async def is_url_ready(url: str) -> bool:
+        return ready
+
+    galaxy_manager._is_url_ready = is_url_ready  # type: ignore
+    run(galaxy_manager._scan_jobs())
+    assert cache.get("galaxy_probe:job0")["failures"] == 1
+
+    # The job isn't probed again until its backoff has passed.
+    ready = True
+    assert not run(galaxy_manager._scan_jobs())[0]["url_ready"]
+
+    probe = cache.get("galaxy_probe:job0")
+    cache.set("galaxy_probe:job0", {**probe, "next_probe": time() - 1})
+    assert run(galaxy_manager._scan_jobs())[0]["url_ready"]
+    # The URL was only looked up once.
+    assert galaxy.url_lookups == ["job0"]
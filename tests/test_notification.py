@@ -0,0 +1,47 @@
+"""Tests for serving the system notification to polling clients."""
+
+import pytest
+from django.core.cache import cache
+from django.test import Client
+
+from src.launcher_app.notification import NotificationManager
+
+pytestmark = pytest.mark.usefixtures("database")
+
+URL = "/api/notification/"
+
+
+def test_not_modified() -> None:
+    NotificationManager().set({"display": True, "message": "Maintenance tonight"})
+    client = Client()
+
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.json() == {"display": True, "message": "Maintenance tonight"}
+    assert response["Cache-Control"] == "no-cache"
+
+    response = client.get(URL, headers={"If-None-Match": response["ETag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_changed_notification_is_sent() -> None:
+    NotificationManager().set({"display": True, "message": "Maintenance tonight"})
+    client = Client()
+    etag = client.get(URL)["ETag"]
+
+    NotificationManager().set({"message": "Maintenance is over"})
+
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == {"display": True, "message": "Maintenance is over"}
+    assert response["ETag"] != etag
+
+
+def test_same_version_after_cache_expires() -> None:
+    NotificationManager().set({"display": False, "message": "Hidden"})
+    version = NotificationManager().get_versioned()[0]
+
+    cache.clear()
+
+    assert NotificationManager().get_versioned()[0] == version
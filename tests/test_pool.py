@@ -0,0 +1,79 @@
+"""Tests for the pool of Galaxy connections."""
+
+from time import monotonic
+from typing import cast
+
+import pytest
+from django.test import override_settings
+
+from src.launcher_app import pool
+from src.launcher_app.pool import ConnectionPool
+
+
+class FakePooledConnection(pool.PooledConnection):
+    """Pooled connection that doesn't connect to Galaxy."""
+
+    def __init__(self, api_key: str):
+        """Init."""
+        self.api_key = api_key
+        self.last_used = monotonic()
+        self.history_ids = {}
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_connections(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pool, "PooledConnection", FakePooledConnection)
+
+
+def is_closed(connection: pool.PooledConnection) -> bool:
+    return cast(FakePooledConnection, connection).closed
+
+
+def test_reuses_connection() -> None:
+    connection_pool = ConnectionPool()
+
+    assert connection_pool.acquire("key") is connection_pool.acquire("key")
+
+
+@override_settings(GALAXY_CONNECTION_POOL_SIZE=2)
+def test_evicts_least_recently_used() -> None:
+    connection_pool = ConnectionPool()
+    first = connection_pool.acquire("first")
+    second = connection_pool.acquire("second")
+    connection_pool.acquire("first")
+
+    connection_pool.acquire("third")
+
+    assert is_closed(second)
+    assert not is_closed(first)
+    assert connection_pool.acquire("first") is first
+    assert connection_pool.acquire("second") is not second
+
+
+@override_settings(GALAXY_CONNECTION_IDLE_TIMEOUT=60)
+def test_evicts_idle_connections() -> None:
+    connection_pool = ConnectionPool()
+    idle = connection_pool.acquire("idle")
+    active = connection_pool.acquire("active")
+    idle.last_used -= 61
+
+    connection_pool.acquire("active")
+
+    assert is_closed(idle)
+    assert not is_closed(active)
+    assert connection_pool.acquire("idle") is not idle
+
+
+def test_discard() -> None:
+    connection_pool = ConnectionPool()
+    connection = connection_pool.acquire("key")
+
+    connection_pool.discard("key")
+    connection_pool.discard("missing")
+
+    assert is_closed(connection)
+    assert connection_pool.acquire("key") is not connection
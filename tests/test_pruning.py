@@ -0,0 +1,52 @@
+"""Tests for pruning OAuth session states from logins that were never finished."""
+
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from src.launcher_app.models import OAuthSessionState
+from src.launcher_app.pruning import prune_oauth_states
+
+pytestmark = pytest.mark.usefixtures("database")
+
+MAX_AGE = 60 * 60
+
+
+def create_state(age: int, username: str = "") -> OAuthSessionState:
+    user = get_user_model().objects.create_user(username=username) if username else None  # type: ignore
+    state = OAuthSessionState.objects.create(user=user, state_param=f"{username}{age}")
+    # create_time is set automatically when the state is created.
+    OAuthSessionState.objects.filter(pk=state.pk).update(create_time=now() - timedelta(seconds=age))
+
+    return state
+
+
+def test_prunes_old_unfinished_states() -> None:
+    OAuthSessionState.objects.all().delete()
+    stale = [create_state(MAX_AGE + 60 + i) for i in range(5)]
+    recent = create_state(60)
+    finished = create_state(MAX_AGE + 60, username="finished@example.com")
+
+    deleted, _ = prune_oauth_states(MAX_AGE, batch_size=2)
+
+    assert deleted == len(stale)
+    assert set(OAuthSessionState.objects.values_list("pk", flat=True)) == {recent.pk, finished.pk}
+    assert prune_oauth_states(MAX_AGE, batch_size=2)[0] == 0
+
+
+def test_delete_checks_conditions_again() -> None:
+    # A login can finish between selecting a batch and deleting it.
+    OAuthSessionState.objects.all().delete()
+    create_state(MAX_AGE + 60)
+
+    with CaptureQueriesContext(connection) as queries:
+        prune_oauth_states(MAX_AGE, batch_size=2)
+
+    deletes = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("DELETE")]
+    assert len(deletes) == 1
+    assert '"user_id" IS NULL' in deletes[0]
+    assert '"create_time" <' in deletes[0]
@@ -0,0 +1,58 @@
+"""Tests for caching the system status for all clients."""
+
+from asyncio import run
+from typing import Any, Dict, List
+
+import pytest
+
+from src.launcher_app.status import StatusManager
+
+
+class FakePrometheus:
+    """Counts the fetches of each list and fails the first failures fetches."""
+
+    def __init__(self, failures: int = 0):
+        """Init."""
+        self.fetches: List[str] = []
+        self.failures = failures
+
+    async def __call__(self, kind: str) -> List[Dict[str, Any]]:
+        self.fetches.append(kind)
+        if len(self.fetches) <= self.failures:
+            raise ValueError("Prometheus is down")
+
+        return [{"kind": kind, "fetch": len(self.fetches)}]
+
+
+def create_status_manager(monkeypatch: pytest.MonkeyPatch, prometheus: FakePrometheus) -> StatusManager:
+    status_manager = StatusManager()
+    monkeypatch.setattr(status_manager, "_fetch", prometheus)
+
+    return status_manager
+
+
+def test_lists_are_shared(monkeypatch: pytest.MonkeyPatch) -> None:
+    prometheus = FakePrometheus()
+    status_manager = create_status_manager(monkeypatch, prometheus)
+
+    alerts = run(status_manager.get_alerts())
+    # The targets were fetched along with the alerts.
+    targets = run(StatusManager().get_targets())
+
+    assert alerts == [{"kind": "alerts", "fetch": 1}]
+    assert targets == [{"kind": "targets", "fetch": 2}]
+    assert run(StatusManager().get_alerts()) == alerts
+    assert sorted(prometheus.fetches) == ["alerts", "targets"]
+
+
+def test_failures_arent_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    prometheus = FakePrometheus(failures=1)
+    status_manager = create_status_manager(monkeypatch, prometheus)
+
+    with pytest.raises(ValueError):
+        run(status_manager.get_alerts())
+    # The targets were still cached.
+    assert run(status_manager.get_targets()) == [{"kind": "targets", "fetch": 2}]
+
+    assert run(status_manager.get_alerts()) == [{"kind": "alerts", "fetch": 3}]
+    assert prometheus.fetches == ["alerts", "targets", "alerts"]
@@ -0,0 +1,69 @@
+"""Tests for extracting tool descriptions from tool help HTML.
+
+The expected descriptions are the ones that BeautifulSoup's get_text() gave for the same help, which is what the tool
+list used before ToolHelpParser.
+"""
+
+import pytest
+
+from src.launcher_app.galaxy import ToolHelpParser
+
+
+@pytest.mark.parametrize(
+    ("tool_help", "description"),
+    [
+        ("", ""),
+        ("<p>Visualizes reduced data.</p>\n<p>More details.</p>", "Visualizes reduced data."),
+        ("\n\n  <div>\n <p>  First <b>bold</b> line  </p>\n<p>second</p></div>", "First bold line"),
+        ("<p>unclosed <b>bold", "unclosed bold"),
+    ],
+)
+def test_first_line(tool_help: str, description: str) -> None:
+    assert ToolHelpParser().parse(tool_help) == description
+
+
+@pytest.mark.parametrize(
+    ("tool_help", "description"),
+    [
+        ("<script>var x;\n</script><style>p {}\n</style>Shown\nhidden", "Shown"),
+        ("<template>T\n</template><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby> text", "漢 text"),
+        ("<!-- a\ncomment -->Text", "Text"),
+        ("<![CDATA[raw <b>text</b>]]>", "raw <b>text</b>"),
+        ("<template><![cdata[shown]]></template>", "shown"),
+    ],
+)
+def test_hidden_text(tool_help: str, description: str) -> None:
+    assert ToolHelpParser().parse(tool_help) == description
+
+
+@pytest.mark.parametrize(
+    ("tool_help", "description"),
+    [
+        ("<p>a</p>  \t  <p>b</p>", "a b"),
+        ("<pre>  indented\tcode\n</pre>", "indented\tcode"),
+    ],
+)
+def test_whitespace(tool_help: str, description: str) -> None:
+    assert ToolHelpParser().parse(tool_help) == description
+
+
+@pytest.mark.parametrize(
+    ("tool_help", "description"),
+    [
+        ("&lt;tag&gt; &copy &#169; &#x41; &#150;", "<tag> © © A –"),
+        ("text &amp more", "text & more"),
+        ("text &amp", "text &amp"),
+        ("a &ampx b", "a &ampx b"),
+        ("&notit;", "&notit"),
+        ("&#0; &#xd800;", "� �"),
+    ],
+)
+def test_character_references(tool_help: str, description: str) -> None:
+    assert ToolHelpParser().parse(tool_help) == description
+
+
+def test_stops_after_first_line() -> None:
+    parser = ToolHelpParser()
+
+    assert parser.parse("<p>First</p>\n<p>Second</p>" + "<p>more</p>" * 1000) == "First"
+    assert len(parser.open_tags) < 10